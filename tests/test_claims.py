@@ -0,0 +1,42 @@
+from tg_signer.claims import ClaimStore
+
+
+def test_only_one_account_claims_a_message(tmp_path):
+    file = tmp_path / "claims.sqlite3"
+    a = ClaimStore(file, owner="a", task="t", lease=60)
+    b = ClaimStore(file, owner="b", task="t", lease=60)
+    other_task = ClaimStore(file, owner="b", task="other", lease=60)
+
+    assert a.claim(1, 100, now=0)
+    assert not b.claim(1, 100, now=1)
+    assert other_task.claim(1, 100, now=1)
+    assert b.claim(1, 101, now=1)
+    assert a.stats() == {"claimed": 1, "skipped": 0, "taken_over": 0}
+    assert b.stats()["skipped"] == 1
+
+    # 已完成的消息不会被接管
+    a.complete(1, 100)
+    assert not b.claim(1, 100, now=1000)
+    assert not a.claim(1, 100, now=1000)
+    a.close()
+    b.close()
+    other_task.close()
+
+
+def test_claim_fails_over_when_owner_is_offline(tmp_path):
+    file = tmp_path / "claims.sqlite3"
+    a = ClaimStore(file, owner="a", task="t", lease=60)
+    b = ClaimStore(file, owner="b", task="t", lease=60)
+
+    assert a.claim(1, 100, now=0)
+    a.heartbeat(now=30)
+    assert not b.claim(1, 100, now=80)
+    # 租约到期前再次检查不重复计入skipped
+    assert not b.claim(1, 100, now=85, recheck=True)
+    assert b.skipped == 1
+    # a超过租约时间没有心跳
+    assert b.claim(1, 100, now=91)
+    assert b.taken_over == 1
+    assert not a.claim(1, 100, now=92)
+    a.close()
+    b.close()
@@ -119,3 +119,884 @@ async def test_client_context_manager_reference_counting_and_start_stop(
 
     # instance should be removed from cache after stop
     assert key not in core._CLIENT_INSTANCES
+
+
+@pytest.mark.asyncio
+async def test_wait_for_wakes_on_new_message(tmp_path):
+    """wait_for should be woken by `_on_message` instead of polling, and each
+    message should be handled at most once per action.
+    """
+    from unittest.mock import MagicMock
+
+    from tg_signer.config import ClickKeyboardByTextAction, SignChatV3
+    from tg_signer.core import UserSigner
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    action = ClickKeyboardByTextAction(text="签到")
+    chat = SignChatV3(chat_id=100, actions=[action])
+    signer.context.sign_chats[chat.chat_id].append(chat)
+
+    seen = []
+
+    async def fake_click(_action, message):
+        seen.append(message.id)
+        return message.text == "签到"
+
+    signer._click_keyboard_by_text = fake_click
+
+    def make_message(message_id, text):
+        message = MagicMock()
+        message.id = message_id
+        message.text = text
+        message.chat.id = chat.chat_id
+        return message
+
+    await signer._on_message(None, make_message(1, "hello"))
+
+    async def deliver():
+        await asyncio.sleep(0.05)
+        await signer._on_message(None, make_message(2, "签到"))
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deliver_task = asyncio.create_task(deliver())
+    await signer.wait_for(chat, action, timeout=5)
+    await deliver_task
+    assert loop.time() - start < 1
+    assert seen == [1, 2]
+    assert signer.context.chat_messages[chat.chat_id][2] is None
+    assert not signer.context.waiter
+
+
+@pytest.mark.asyncio
+async def test_client_keep_alive_defers_stop(monkeypatch, tmp_path):
+    """A client asked to keep alive should stay connected after the last exit,
+    be reused by the next entry, and only stop once the idle period elapses.
+    """
+    import tg_signer.core as core
+
+    _clear_client_state()
+
+    calls = []
+
+    async def fake_start(self):
+        calls.append("start")
+
+    async def fake_stop(self):
+        calls.append("stop")
+
+    async def fake_noop(self):
+        return None
+
+    monkeypatch.setattr(core.Client, "start", fake_start)
+    monkeypatch.setattr(core.Client, "stop", fake_stop)
+    monkeypatch.setattr(core.Client, "connect", fake_noop)
+    monkeypatch.setattr(core.Client, "get_me", fake_noop)
+
+    client = get_client(name="warm", workdir=tmp_path)
+    client.keep_alive(0.1)
+    async with client:
+        pass
+    assert calls == ["start"]
+    assert client.key in core._CLIENT_INSTANCES
+    assert client.connect_latency is not None
+
+    # re-entering within the idle period reuses the connection
+    async with client:
+        assert calls == ["start"]
+
+    await asyncio.sleep(0.2)
+    assert calls == ["start", "stop"]
+    assert client.key not in core._CLIENT_INSTANCES
+
+
+@pytest.mark.asyncio
+async def test_ensure_login_uses_cache(tmp_path):
+    from tg_signer.core import UserSigner
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    logins = []
+
+    async def fake_login(num_of_dialogs=20, print_chat=True):
+        logins.append(num_of_dialogs)
+        me = type(
+            "Me",
+            (),
+            {
+                "id": 42,
+                "is_bot": False,
+                "username": "me",
+                "first_name": "M",
+                "last_name": None,
+            },
+        )()
+        signer.user = me
+        signer.write_login_cache(me, [100, 200])
+
+    signer.login = fake_login
+
+    # no cache yet
+    await signer.ensure_login(chat_ids=[100])
+    assert logins == [20]
+
+    # fresh cache and known chats -> no login
+    signer.user = None
+    await signer.ensure_login(chat_ids=[100, 200, "@username"])
+    assert logins == [20]
+    assert signer.user.id == 42
+
+    # unknown chat -> refresh
+    signer.user = None
+    await signer.ensure_login(chat_ids=[300])
+    assert logins == [20, 20]
+
+    # stale cache -> refresh
+    signer.user = None
+    signer.login_cache_ttl = 0
+    await signer.ensure_login(chat_ids=[100])
+    assert logins == [20, 20, 20]
+
+
+@pytest.mark.asyncio
+async def test_message_deleter_batches_and_persists(tmp_path):
+    from tg_signer.core import MessageDeleter
+
+    calls = []
+
+    class FakeClient:
+        async def delete_messages(self, chat_id, message_ids):
+            calls.append((chat_id, list(message_ids)))
+
+    store_file = tmp_path / "deletions.json"
+    deleter = MessageDeleter(FakeClient(), store_file)
+    deleter.schedule(1, 10, 0.05)
+    deleter.schedule(1, 11, 0.05)
+    deleter.schedule(2, 20, 0.05)
+    # schedule returns immediately and the queue is persisted
+    assert len(deleter) == 3
+    assert len(MessageDeleter(FakeClient(), store_file)) == 3
+
+    await deleter.drain()
+    assert sorted(calls) == [(1, [10, 11]), (2, [20])]
+    assert len(deleter) == 0
+    assert len(MessageDeleter(FakeClient(), store_file)) == 0
+
+
+@pytest.mark.asyncio
+async def test_precise_fire_sends_first_action_on_time(tmp_path):
+    """precise_fire should release the prebuilt first action at the target
+    instant (server time), and sign_a_chat should not send it again.
+    """
+    import time
+    from datetime import datetime
+    from types import SimpleNamespace
+
+    from pyrogram import raw
+
+    from tg_signer.config import SendTextAction, SignChatV3, SignConfigV3
+    from tg_signer.core import UserSigner
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    server_offset = 3
+    sent = []
+
+    async def fake_invoke(query):
+        if isinstance(query, raw.functions.help.GetConfig):
+            return SimpleNamespace(date=int(time.time() + server_offset))
+        sent.append(time.time())
+        return raw.types.UpdateShortSentMessage(
+            id=7, pts=1, pts_count=1, date=int(time.time() + server_offset)
+        )
+
+    signer.app.invoke = fake_invoke
+    offset = await signer.estimate_server_time_offset(samples=3)
+    assert abs(offset - server_offset) <= 1
+
+    async def fake_build(chat):
+        return raw.functions.help.GetNearestDc()
+
+    async def fake_offset():
+        return server_offset
+
+    signer._build_first_request = fake_build
+    signer.estimate_server_time_offset = fake_offset
+    chat = SignChatV3(chat_id=100, actions=[SendTextAction(text="签到")])
+    config = SignConfigV3(chats=[chat], sign_at="0 6 * * *")
+    target = time.time() + server_offset + 0.3
+    fire_at = datetime.fromtimestamp(target)
+    await signer.precise_fire(config, fire_at)
+    assert len(sent) == 1
+    assert abs(sent[0] + server_offset - target) < 0.05
+    assert id(config.chats[0]) in signer.context.prefired
+    # 发送前已登记，Bot的回复不会被当作意料之外的聊天
+    assert signer.context.sign_chats[100] == [config.chats[0]]
+    assert signer.context.started_at > 0
+
+
+@pytest.mark.asyncio
+async def test_on_message_prefetches_pending_ai_action(tmp_path):
+    """An incoming message for a pending calculation action should start the
+    AI request right away, and the action handler should reuse its result.
+    """
+    from unittest.mock import MagicMock
+
+    from tg_signer.config import ReplyByCalculationProblemAction, SignChatV3
+    from tg_signer.core import UserSigner
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    action = ReplyByCalculationProblemAction()
+    chat = SignChatV3(chat_id=100, actions=[action])
+    signer.context.sign_chats[chat.chat_id].append(chat)
+    signer.context.pending_actions[chat.chat_id] = action
+
+    calls = []
+    sent = []
+
+    class FakeAITools:
+        async def calculate_problem(self, text):
+            calls.append(text)
+            await asyncio.sleep(0.01)
+            return "2"
+
+    async def fake_send_message(chat_id, text, *args, **kwargs):
+        sent.append((chat_id, text))
+
+    signer.get_ai_tools = FakeAITools
+    signer.send_message = fake_send_message
+
+    def make_message(message_id, text, is_bot=True):
+        message = MagicMock()
+        message.id = message_id
+        message.text = text
+        message.chat.id = chat.chat_id
+        message.from_user.is_bot = is_bot
+        return message
+
+    # 非Bot发送的消息不提前调用大模型
+    await signer._on_message(None, make_message(3, "闲聊", is_bot=False))
+    assert not signer.context.prefetches
+
+    message = make_message(1, "1+1=?")
+    await signer._on_message(None, message)
+    assert signer.context.prefetches[chat.chat_id][0].id == message.id
+    # 已有进行中的调用时不再开始新的
+    await signer._on_message(None, make_message(2, "2+2=?"))
+    assert signer.context.prefetches[chat.chat_id][0].id == message.id
+    await asyncio.sleep(0.02)
+
+    record = signer.context.chat_messages[chat.chat_id].get(message.id)
+    assert await signer._reply_by_calculation_problem(action, record)
+    assert calls == ["1+1=?"]
+    assert sent == [(chat.chat_id, "2")]
+    assert not signer.context.prefetches
+
+
+@pytest.mark.asyncio
+async def test_client_lite_session_and_upgrade(monkeypatch, tmp_path):
+    """A lite session should connect without updates, and a nested full
+    session should switch the shared connection to full mode.
+    """
+    import tg_signer.core as core
+    from tg_signer.config import SendTextAction, SignChatV3, SignConfigV3
+
+    _clear_client_state()
+
+    async def fake_noop(self):
+        return None
+
+    monkeypatch.setattr(core.Client, "start", fake_noop)
+    monkeypatch.setattr(core.Client, "stop", fake_noop)
+    monkeypatch.setattr(core.Client, "connect", fake_noop)
+    monkeypatch.setattr(core.Client, "get_me", fake_noop)
+
+    client = get_client(name="lite", workdir=tmp_path)
+    async with client.connected(lite=True):
+        assert client.no_updates is True
+        assert await client.handle_updates(object()) is None
+        async with client.connected(lite=True):
+            assert client.no_updates is True
+        async with client:
+            assert client.no_updates is False
+    assert core._CLIENT_REFS[client.key] == 0
+
+    send_only = SignConfigV3(
+        chats=[SignChatV3(chat_id=1, actions=[SendTextAction(text="签到")])],
+        sign_at="0 6 * * *",
+    )
+    assert send_only.send_only
+
+
+@pytest.mark.asyncio
+async def test_message_handlers_are_registered_once(tmp_path):
+    """Repeated registration must not duplicate handlers, and removal should
+    leave no handlers behind.
+    """
+    from tg_signer.core import UserSigner
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    for _ in range(3):
+        signer.add_message_handlers([100])
+    await asyncio.sleep(0)
+    assert signer.app.handler_count == 2
+    assert sum(len(g) for g in signer.app.dispatcher.groups.values()) == 2
+
+    signer.remove_message_handlers()
+    await asyncio.sleep(0)
+    assert signer.app.handler_count == 0
+    assert sum(len(g) for g in signer.app.dispatcher.groups.values()) == 0
+
+
+@pytest.mark.asyncio
+async def test_client_fast_start(monkeypatch, tmp_path):
+    """start should validate the session with a single request, skip get_me
+    when an identity is cached, record per-phase timings, and refuse
+    unauthorized sessions without leaking a reference.
+    """
+    from pyrogram import raw
+    from pyrogram.types import User
+
+    import tg_signer.core as core
+
+    _clear_client_state()
+
+    calls = []
+    authorized = True
+
+    async def fake_connect(self):
+        calls.append("connect")
+        return authorized
+
+    async def fake_invoke(self, query, *args, **kwargs):
+        calls.append(type(query).__name__)
+
+    async def fake_get_me(self):
+        calls.append("get_me")
+        return User(id=1)
+
+    async def fake_noop(self):
+        calls.append("disconnect")
+
+    async def fake_initialize(self):
+        calls.append("initialize")
+
+    async def fake_stop(self):
+        pass
+
+    monkeypatch.setattr(core.Client, "connect", fake_connect)
+    monkeypatch.setattr(core.Client, "invoke", fake_invoke)
+    monkeypatch.setattr(core.Client, "get_me", fake_get_me)
+    monkeypatch.setattr(core.Client, "disconnect", fake_noop)
+    monkeypatch.setattr(core.Client, "initialize", fake_initialize)
+    monkeypatch.setattr(core.Client, "stop", fake_stop)
+
+    client = get_client(name="fast", workdir=tmp_path)
+    client.cached_me = User(id=1, is_self=True)
+    async with client:
+        assert client.me is client.cached_me
+    assert calls == ["connect", raw.functions.updates.GetState.__name__, "initialize"]
+    assert set(core._CLIENT_CONNECT_PHASES[client.key]) == {"connect", "auth", "start"}
+
+    calls.clear()
+    authorized = False
+    client = get_client(name="fast", workdir=tmp_path)
+    with pytest.raises(ConnectionError):
+        async with client:
+            pass
+    assert calls == ["connect", "disconnect"]
+    assert core._CLIENT_REFS[client.key] == 0
+
+
+@pytest.mark.asyncio
+async def test_sync_server_schedule_reconciles_and_skips_connection(tmp_path):
+    """Scheduled sign messages should be topped up without duplicating the
+    ones already on the server, and no connection is made while the local
+    coverage is above the low-water mark.
+    """
+    import contextlib
+    from datetime import timedelta
+    from types import SimpleNamespace
+
+    from pyrogram.types import User
+
+    from tg_signer.config import SendTextAction, SignChatV3, SignConfigV3
+    from tg_signer.core import UserSigner, get_now
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer.user = User(id=1)
+    config = SignConfigV3(
+        chats=[SignChatV3(chat_id=100, actions=[SendTextAction(text="签到")])],
+        sign_at="0 6 * * *",
+        server_schedule_days=5,
+        server_schedule_low_days=2,
+    )
+    assert signer.uses_server_schedule(config)
+
+    now = get_now()
+    first = (now + timedelta(days=1)).replace(hour=6, minute=0, second=0)
+    if first - timedelta(days=1) > now + timedelta(minutes=1):
+        first -= timedelta(days=1)
+    existing = [SimpleNamespace(text="签到", dice=None, date=first)]
+    scheduled = []
+    connections = []
+
+    @contextlib.asynccontextmanager
+    async def fake_connected(lite=False):
+        connections.append(lite)
+        yield signer.app
+
+    async def fake_get_scheduled_messages(chat_id):
+        return existing
+
+    async def fake_send_message(chat_id, text, schedule_date=None):
+        scheduled.append(schedule_date)
+
+    signer.app.connected = fake_connected
+    signer.app.get_scheduled_messages = fake_get_scheduled_messages
+    signer.app.send_message = fake_send_message
+
+    next_check = await signer.sync_server_schedule(config)
+    assert connections == [True]
+    assert len(scheduled) == 4
+    assert first not in scheduled
+    assert all(d > first for d in scheduled)
+    assert next_check > now + timedelta(days=2)
+
+    # 覆盖天数充足时不连接
+    assert await signer.sync_server_schedule(config) == next_check
+    assert connections == [True]
+
+
+@pytest.mark.asyncio
+async def test_client_drops_updates_older_than_connection(monkeypatch, tmp_path):
+    """Message updates dated before the connection was established are
+    dropped before pyrogram processes them (no catch-up requests).
+    """
+    import time
+
+    from pyrogram import Client as BaseClient
+    from pyrogram import raw
+
+    _clear_client_state()
+
+    handled = []
+
+    async def fake_handle_updates(self, updates):
+        handled.append(updates)
+
+    monkeypatch.setattr(BaseClient, "handle_updates", fake_handle_updates)
+
+    client = get_client(name="stale", workdir=tmp_path)
+    client.updates_since = time.time()
+
+    def new_message(message_id, date):
+        return raw.types.UpdateNewMessage(
+            message=raw.types.Message(
+                id=message_id,
+                peer_id=raw.types.PeerUser(user_id=1),
+                date=int(date),
+                message="hi",
+            ),
+            pts=1,
+            pts_count=1,
+        )
+
+    old = new_message(1, client.updates_since - 3600)
+    fresh = new_message(2, client.updates_since)
+    await client.handle_updates(
+        raw.types.Updates(
+            updates=[old, fresh], users=[], chats=[], date=int(time.time()), seq=0
+        )
+    )
+    assert [u.message.id for u in handled[0].updates] == [2]
+
+    await client.handle_updates(
+        raw.types.Updates(
+            updates=[old], users=[], chats=[], date=int(time.time()), seq=0
+        )
+    )
+    short = raw.types.UpdateShortMessage(
+        id=3,
+        user_id=1,
+        message="hi",
+        pts=1,
+        pts_count=1,
+        date=int(client.updates_since - 3600),
+    )
+    await client.handle_updates(short)
+    assert len(handled) == 1
+    assert client.stale_updates == 3
+
+    # 本机时钟快5分钟时，按更新中的服务器时间判断，不会丢弃新消息
+    client.updates_since = time.time()
+    server_now = client.updates_since - 300
+    await client.handle_updates(
+        raw.types.Updates(
+            updates=[new_message(3, server_now)],
+            users=[],
+            chats=[],
+            date=int(server_now),
+            seq=0,
+        )
+    )
+    assert [u.message.id for u in handled[-1].updates] == [3]
+    assert client.stale_updates == 3
+
+
+@pytest.mark.asyncio
+async def test_client_prefilters_updates_by_watched_peers(monkeypatch, tmp_path):
+    from pyrogram import Client as BaseClient
+    from pyrogram import raw
+
+    _clear_client_state()
+
+    handled = []
+
+    async def fake_handle_updates(self, updates):
+        handled.append(updates)
+
+    monkeypatch.setattr(BaseClient, "handle_updates", fake_handle_updates)
+
+    client = get_client(name="watch", workdir=tmp_path)
+
+    def channel_message(channel_id):
+        return raw.types.UpdateNewChannelMessage(
+            message=raw.types.Message(
+                id=1,
+                peer_id=raw.types.PeerChannel(channel_id=channel_id),
+                date=0,
+                message="hi",
+            ),
+            pts=1,
+            pts_count=1,
+        )
+
+    def updates():
+        return raw.types.Updates(
+            updates=[
+                channel_message(111),
+                channel_message(222),
+                raw.types.UpdateUserStatus(
+                    user_id=1, status=raw.types.UserStatusEmpty()
+                ),
+            ],
+            users=[],
+            chats=[],
+            date=0,
+            seq=0,
+        )
+
+    client.watch_peers("monitor", [-1000000000111, 42])
+    client.watch_peers("signer", [-1000000000111])
+    assert client.watched_peers == frozenset({-1000000000111, 42})
+    await client.handle_updates(updates())
+    kept = handled[-1].updates
+    assert [type(u).__name__ for u in kept] == [
+        "UpdateNewChannelMessage",
+        "UpdateUserStatus",
+    ]
+    assert kept[0].message.peer_id.channel_id == 111
+
+    short = raw.types.UpdateShortChatMessage(
+        id=2, from_id=1, chat_id=7, message="hi", pts=1, pts_count=1, date=0
+    )
+    await client.handle_updates(short)
+    assert handled[-1] is not short
+    assert client.filtered_updates == 2
+
+    # username无法直接对应到id时不做过滤
+    client.watch_peers("monitor", ["some_channel"])
+    assert client.watched_peers is None
+    await client.handle_updates(short)
+    assert handled[-1] is short
+
+    client.unwatch_peers("monitor")
+    client.unwatch_peers("signer")
+    await client.handle_updates(updates())
+    assert len(handled[-1].updates) == 3
+
+
+@pytest.mark.asyncio
+async def test_run_cycle_resumes_from_journal_after_crash(tmp_path):
+    import contextlib
+
+    from pyrogram.types import User
+
+    from tg_signer.config import SendTextAction, SignChatV3, SignConfigV3
+    from tg_signer.core import UserSigner
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer.user = User(id=1)
+    config = SignConfigV3(
+        chats=[
+            SignChatV3(
+                chat_id=chat_id,
+                action_interval=0,
+                actions=[SendTextAction(text="a"), SendTextAction(text="b")],
+            )
+            for chat_id in (100, 200)
+        ],
+        sign_at="0 6 * * *",
+        sign_interval=0,
+    )
+    sent = []
+    crash = {"at": (200, "b")}
+
+    @contextlib.asynccontextmanager
+    async def fake_connected(lite=False):
+        yield signer.app
+
+    async def fake_send_message(chat_id, text, delete_after=None, **kwargs):
+        if crash["at"] == (chat_id, text):
+            crash["at"] = None
+            raise RuntimeError("crash")
+        sent.append((chat_id, text))
+
+    signer.app.connected = fake_connected
+    signer.send_message = fake_send_message
+
+    with pytest.raises(RuntimeError):
+        await signer.run_cycle(config, only_once=True)
+    assert sent == [(100, "a"), (100, "b"), (200, "a")]
+    assert signer.journal_file.is_file()
+    assert signer.load_sign_record() == {}
+
+    sent.clear()
+    now = await signer.run_cycle(config, only_once=True)
+    assert sent == [(200, "b")]
+    assert not signer.journal_file.is_file()
+    assert str(now.date()) in signer.load_sign_record()
+
+
+@pytest.mark.asyncio
+async def test_monitor_suppresses_duplicate_messages(tmp_path):
+    from unittest.mock import MagicMock
+
+    from tg_signer.config import MatchConfig, MonitorConfig
+    from tg_signer.core import UserMonitor
+    from tg_signer.dedup import DedupWindow
+
+    _clear_client_state()
+
+    monitor = UserMonitor(task_name="m", session_dir=tmp_path, workdir=tmp_path)
+    monitor.config = MonitorConfig(
+        match_cfgs=[
+            MatchConfig(chat_id=chat_id, rule="contains", rule_value="news")
+            for chat_id in (1, 2)
+        ],
+        dedup_window=60,
+    )
+    monitor.dedup = DedupWindow(60)
+    submitted = []
+    monitor.dispatcher = MagicMock()
+    monitor.dispatcher.submit.side_effect = lambda key, job: submitted.append(key)
+
+    def message(chat_id, text):
+        m = MagicMock()
+        m.text = text
+        m.chat.id = chat_id
+        m.from_user = None
+        return m
+
+    await monitor.on_message(None, message(1, "Big NEWS"))
+    await monitor.on_message(None, message(2, "big news "))
+    await monitor.on_message(None, message(2, "other news"))
+    assert submitted == [1, 2]
+
+    monitor.config.dedup_scope = "chat"
+    await monitor.on_message(None, message(2, "Big NEWS"))
+    await monitor.on_message(None, message(2, "Big NEWS"))
+    assert submitted == [1, 2, 2]
+
+
+@pytest.mark.asyncio
+async def test_monitor_dispatches_when_claims_unavailable(tmp_path):
+    import sqlite3
+    from unittest.mock import MagicMock
+
+    from pyrogram.enums import ChatType
+
+    from tg_signer.config import MatchConfig, MonitorConfig
+    from tg_signer.core import UserMonitor
+
+    _clear_client_state()
+
+    monitor = UserMonitor(task_name="m", session_dir=tmp_path, workdir=tmp_path)
+    monitor.config = MonitorConfig(
+        match_cfgs=[MatchConfig(chat_id=1, rule="contains", rule_value="news")],
+    )
+    monitor.claims = MagicMock()
+    monitor.claims.claim.side_effect = sqlite3.OperationalError("database is locked")
+    monitor.claims.complete.side_effect = sqlite3.OperationalError("database is locked")
+    submitted = []
+    monitor.dispatcher = MagicMock()
+    monitor.dispatcher.submit.side_effect = lambda key, job: submitted.append(job)
+
+    message = MagicMock()
+    message.text = "news"
+    message.chat.id = 1
+    message.chat.type = ChatType.SUPERGROUP
+    message.from_user = None
+    await monitor.on_message(None, message)
+    # 认领表被锁定时直接处理，标记完成失败也不影响后续任务
+    assert len(submitted) == 2
+    await submitted[-1]()
+
+
+@pytest.mark.asyncio
+async def test_monitor_claims_only_channel_messages(tmp_path):
+    from unittest.mock import MagicMock
+
+    from pyrogram.enums import ChatType
+
+    from tg_signer.claims import ClaimStore
+    from tg_signer.config import MatchConfig, MonitorConfig
+    from tg_signer.core import UserMonitor
+
+    _clear_client_state()
+
+    submitted = []
+
+    def make_monitor(account):
+        monitor = UserMonitor(task_name="m", session_dir=tmp_path, workdir=tmp_path)
+        monitor.config = MonitorConfig(
+            match_cfgs=[MatchConfig(chat_id=1, rule="contains", rule_value="news")],
+        )
+        monitor.claims = ClaimStore(tmp_path / "claims.sqlite3", owner=account)
+        monitor._failovers = set()
+        monitor.dispatcher = MagicMock()
+        monitor.dispatcher.submit.side_effect = lambda key, job: submitted.append(
+            (account, job.func.__name__)
+        )
+        return monitor
+
+    monitors = [make_monitor("a"), make_monitor("b")]
+
+    def message(chat_type):
+        m = MagicMock()
+        m.text = "news"
+        m.id = 100
+        m.chat.id = 1
+        m.chat.type = chat_type
+        m.from_user = None
+        return m
+
+    # 私聊（包括Bot）及普通群组的消息id按账号独立编号，各账号分别处理
+    for chat_type in (ChatType.BOT, ChatType.PRIVATE, ChatType.GROUP):
+        for monitor in monitors:
+            await monitor.on_message(None, message(chat_type))
+    assert submitted == [("a", "handle_match"), ("b", "handle_match")] * 3
+
+    submitted.clear()
+    for monitor in monitors:
+        await monitor.on_message(None, message(ChatType.SUPERGROUP))
+    for task in monitors[1]._failovers:
+        task.cancel()
+    assert submitted == [("a", "handle_match"), ("a", "_complete_claim")]
+    for monitor in monitors:
+        monitor.claims.close()
+
+
+@pytest.mark.asyncio
+async def test_sign_once_runs_lanes_concurrently_in_order(tmp_path):
+    import time
+
+    from pyrogram.types import User
+
+    from tg_signer.config import SendTextAction, SignChatV3, SignConfigV3
+    from tg_signer.core import UserSigner, get_now
+
+    _clear_client_state()
+
+    signer = UserSigner(task_name="t", session_dir=tmp_path, workdir=tmp_path)
+    signer.user = User(id=1)
+    signer.context = signer.ensure_ctx()
+    config = SignConfigV3(
+        chats=[
+            SignChatV3(chat_id=chat_id, actions=[SendTextAction(text=text)])
+            for chat_id, text in ((100, "a"), (200, "b"), (300, "d"), (100, "c"))
+        ],
+        sign_at="0 6 * * *",
+        max_concurrent_chats=2,
+    )
+    config.sign_interval = 0.1  # 配置中为整数秒，测试中缩短
+    events = []
+    running = {"now": 0, "max": 0}
+
+    async def fake_sign_a_chat(chat, adaptive_timeout=False):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        events.append(("start", chat.actions[0].text, time.monotonic()))
+        await asyncio.sleep(0.01)
+        events.append(("end", chat.actions[0].text, time.monotonic()))
+        running["now"] -= 1
+
+    signer.sign_a_chat = fake_sign_a_chat
+    await signer.sign_once(config, {}, get_now())
+
+    order = [(kind, text) for kind, text, _ in events]
+    # 同一chat_id的配置在同一lane中按顺序执行
+    assert order.index(("end", "a")) < order.index(("start", "c"))
+    assert running["max"] == 2
+    times = {(kind, text): t for kind, text, t in events}
+    # lane等待签到间隔时不占用名额，其他lane随即开始
+    assert times[("start", "d")] - times[("end", "a")] < 0.05
+
+
+def test_sign_config_rejects_invalid_max_concurrent_chats():
+    from pydantic import ValidationError
+
+    from tg_signer.config import SignConfigV3
+
+    for value in (0, -1):
+        with pytest.raises(ValidationError):
+            SignConfigV3(chats=[], sign_at="0 6 * * *", max_concurrent_chats=value)
+
+
+@pytest.mark.asyncio
+async def test_monitor_refresh_keeps_resolved_peers(tmp_path):
+    from unittest.mock import MagicMock
+
+    from tg_signer.config import MatchConfig, MonitorConfig
+    from tg_signer.core import UserMonitor
+
+    _clear_client_state()
+
+    monitor = UserMonitor(task_name="m", session_dir=tmp_path, workdir=tmp_path)
+    monitor.config = MonitorConfig(
+        match_cfgs=[
+            MatchConfig(chat_id=chat_id, rule="contains", rule_value="news")
+            for chat_id in ("@group", "@channel")
+        ],
+    )
+    ids = {"group": -300, "channel": -400}
+    failing = set()
+
+    async def fake_get_chat(username):
+        if username in failing:
+            raise OSError("timeout")
+        return MagicMock(id=ids[username])
+
+    monitor.app.get_chat = fake_get_chat
+    await monitor.resolve_peers()
+    assert monitor.config.matcher.peers == ids
+
+    # 刷新时解析失败的username保留之前的id
+    failing.add("group")
+    ids["channel"] = -500
+    await monitor.resolve_peers()
+    assert monitor.config.matcher.peers == {"group": -300, "channel": -500}
+    monitor.app.unwatch_peers(monitor)
@@ -0,0 +1,49 @@
+from tg_signer.dedup import DedupWindow, normalize_text
+
+
+def test_normalize_text():
+    assert normalize_text("  Hello\n  World ") == "hello world"
+    assert normalize_text(None) == ""
+
+
+def test_dedup_window_expires_and_bounds_size():
+    dedup = DedupWindow(window=60, max_size=2)
+    key = dedup.make_key("Hello  world")
+    assert dedup.make_key("hello world") == key
+    assert dedup.make_key("hello world", 1) != key
+
+    assert not dedup.seen(key, now=0)
+    assert dedup.seen(key, now=30)
+    # 按首次出现时间过期
+    assert not dedup.seen(key, now=61)
+    assert dedup.suppressed == 1
+
+    assert not dedup.seen("a", now=62)
+    assert not dedup.seen("b", now=63)
+    assert len(dedup) == 2
+    assert not dedup.seen(key, now=64)
+
+
+def test_dedup_window_persists(tmp_path):
+    file = tmp_path / "dedup.json"
+    dedup = DedupWindow(window=3600, file=file)
+    key = dedup.make_key("announcement")
+    assert not dedup.seen(key)
+    dedup.save()
+
+    restored = DedupWindow(window=3600, file=file)
+    assert restored.seen(key)
+    assert not DedupWindow(window=3600).seen(key)
+
+
+def test_dedup_window_tracks_unsaved_records(tmp_path):
+    dedup = DedupWindow(window=3600, file=tmp_path / "dedup.json")
+    assert not dedup.dirty
+    key = dedup.make_key("announcement")
+    assert not dedup.seen(key)
+    assert dedup.dirty
+    dedup.save()
+    assert not dedup.dirty
+    # 重复消息不产生新记录
+    assert dedup.seen(key)
+    assert not dedup.dirty
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from tg_signer.dispatch import ChatDispatcher
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_orders_per_chat_and_runs_chats_in_parallel():
+    dispatcher = ChatDispatcher(workers=2)
+    events = []
+    release = asyncio.Event()
+
+    def job(key, value, wait=False):
+        async def fn():
+            if wait:
+                await release.wait()
+            events.append((key, value))
+
+        return fn
+
+    dispatcher.start()
+    dispatcher.submit("slow", job("slow", 1, wait=True))
+    dispatcher.submit("slow", job("slow", 2))
+    dispatcher.submit("fast", job("fast", 1))
+    dispatcher.submit("fast", job("fast", 2))
+    await asyncio.sleep(0.05)
+    # 慢任务只阻塞所在的Chat
+    assert events == [("fast", 1), ("fast", 2)]
+    assert dispatcher.stats()["queue_depths"] == {"slow": 1}
+
+    release.set()
+    await asyncio.sleep(0.05)
+    assert events[2:] == [("slow", 1), ("slow", 2)]
+    assert dispatcher.stats()["processed"] == 4
+    assert dispatcher.stats()["queued"] == 0
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_drops_oldest_and_survives_failures():
+    dispatcher = ChatDispatcher(workers=1, max_queue=2)
+    done = []
+
+    def job(value):
+        async def fn():
+            if value == "bad":
+                raise ValueError(value)
+            done.append(value)
+
+        return fn
+
+    for value in ("a", "bad", "b", "c"):
+        dispatcher.submit(1, job(value))
+    assert dispatcher.dropped == 2
+
+    dispatcher.start()
+    await asyncio.sleep(0.05)
+    assert done == ["b", "c"]
+
+    dispatcher.submit(1, job("bad"))
+    dispatcher.submit(1, job("d"))
+    await asyncio.sleep(0.05)
+    assert done == ["b", "c", "d"]
+    assert dispatcher.failed == 1
+    await dispatcher.stop()
@@ -0,0 +1,60 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from tg_signer.journal import SignJournal
+
+
+def _chats():
+    return [SimpleNamespace(chat_id=100), SimpleNamespace(chat_id=200)]
+
+
+def test_journal_records_and_resumes(tmp_path):
+    file = tmp_path / "sign_journal.jsonl"
+    started = datetime(2026, 1, 1, 6, 0)
+    chats = _chats()
+
+    journal = SignJournal(file)
+    assert journal.load() is None
+    journal.begin(started, chats)
+    journal.record(chats[0], 1)
+    journal.record(chats[0], 2)
+    journal.record(chats[0], 1)  # 不会回退
+    journal.record(chats[1], 1)
+    journal.close()
+    # 模拟中断时只写入了半行
+    with open(file, "a", encoding="utf-8") as fp:
+        fp.write('{"chat": "1:2')
+
+    # 配置重新加载后对象不同，按序号和chat_id对应
+    chats = _chats()
+    journal = SignJournal(file)
+    assert journal.load() == started
+    journal.begin(datetime(2026, 1, 1, 6, 5), chats, resume=True)
+    assert journal.started_at == started
+    assert journal.done_actions(chats[0]) == 2
+    assert journal.done_actions(chats[1]) == 1
+    journal.record(chats[1], 2)
+    journal.close()
+
+    journal = SignJournal(file)
+    journal.load()
+    assert journal.progress == {"0:100": 2, "1:200": 2}
+    journal.finish()
+    assert not file.exists()
+
+
+def test_journal_restarts_without_resume(tmp_path):
+    file = tmp_path / "sign_journal.jsonl"
+    chats = _chats()
+    journal = SignJournal(file)
+    journal.begin(datetime(2026, 1, 1, 6, 0), chats)
+    journal.record(chats[0], 1)
+    journal.close()
+
+    journal = SignJournal(file)
+    journal.load()
+    later = datetime(2026, 1, 2, 6, 0)
+    journal.begin(later, chats, resume=False)
+    assert journal.done_actions(chats[0]) == 0
+    journal.close()
+    assert SignJournal(file).load() == later
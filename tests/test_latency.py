@@ -0,0 +1,37 @@
+from tg_signer.config import ClickKeyboardByTextAction
+from tg_signer.latency import LatencyStats
+
+
+def test_latency_stats_timeout_and_persistence(tmp_path):
+    file = tmp_path / "latency_stats.json"
+    stats = LatencyStats(file)
+    key = LatencyStats.make_key(100, 1, ClickKeyboardByTextAction(text="签到"))
+    assert key == "100:1:3"
+
+    # 样本不足时使用默认值
+    for _ in range(LatencyStats.min_samples - 1):
+        stats.record(key, 0.5)
+    assert stats.timeout(key, 10) == 10
+
+    stats.record(key, 4)
+    assert stats.quantile(key) == 4
+    assert stats.timeout(key, 10) == 8
+    # 快速响应的Bot不会低于floor
+    fast = "1:0:3"
+    for _ in range(10):
+        stats.record(fast, 0.1)
+    assert stats.timeout(fast, 10) == LatencyStats.floor
+    # 慢响应的Bot不会超过ceiling
+    slow = "2:0:3"
+    for _ in range(10):
+        stats.record(slow, 100)
+    assert stats.timeout(slow, 10) == LatencyStats.ceiling
+
+    stats.save()
+    loaded = LatencyStats(file)
+    assert loaded.timeout(key, 10) == 8
+    assert len(loaded.samples[fast]) == 10
+
+    for _ in range(LatencyStats.max_samples + 10):
+        loaded.record(fast, 0.1)
+    assert len(loaded.samples[fast]) == LatencyStats.max_samples
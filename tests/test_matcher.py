@@ -0,0 +1,120 @@
+import json
+import random
+from unittest.mock import MagicMock
+
+from tg_signer.config import MatchConfig, MonitorConfig
+from tg_signer.matcher import AhoCorasick, RuleMatcher
+
+
+def test_aho_corasick_finds_all_patterns():
+    patterns = ["he", "she", "his", "hers", "签到", "到了"]
+    automaton = AhoCorasick(patterns)
+    assert automaton.search("ushers") == {0, 1, 3}
+    assert automaton.search("签到了") == {4, 5}
+    assert automaton.search("nothing") == set()
+
+    rnd = random.Random(0)
+    for _ in range(200):
+        patterns = [
+            "".join(rnd.choice("ab") for _ in range(rnd.randint(1, 4)))
+            for _ in range(5)
+        ]
+        text = "".join(rnd.choice("abc") for _ in range(20))
+        expected = {i for i, p in enumerate(patterns) if p in text}
+        assert AhoCorasick(patterns).search(text) == expected
+
+
+def test_rule_matcher_agrees_with_match_text():
+    cfgs = [
+        MatchConfig(chat_id=1, rule="exact", rule_value="Hello"),
+        MatchConfig(chat_id=1, rule="exact", rule_value="Hello", ignore_case=False),
+        MatchConfig(chat_id=1, rule="contains", rule_value="World"),
+        MatchConfig(chat_id=1, rule="contains", rule_value="World", ignore_case=False),
+        MatchConfig(chat_id=1, rule="contains", rule_value="签到"),
+        MatchConfig(chat_id=1, rule="regex", rule_value=r"\bhello\b"),
+        MatchConfig(chat_id=1, rule="regex", rule_value=r"^\d+$", ignore_case=False),
+        MatchConfig(chat_id=1, rule="all"),
+    ]
+    matcher = RuleMatcher(cfgs)
+    for text in ["hello", "Hello", "hello world", "HELLO WORLD", "123", "今日签到", ""]:
+        expected = [i for i, cfg in enumerate(cfgs) if cfg.match_text(text)]
+        assert matcher.match_text(text) == expected
+
+
+def test_monitor_config_matcher_checks_chat_and_user():
+    config = MonitorConfig(
+        match_cfgs=[
+            MatchConfig(chat_id=1, rule="contains", rule_value="a"),
+            MatchConfig(chat_id=2, rule="contains", rule_value="a"),
+            MatchConfig(chat_id=1, rule="contains", rule_value="b", from_user_ids=[7]),
+        ]
+    )
+    assert config.matcher is config.matcher
+
+    message = MagicMock()
+    message.text = "ab"
+    message.chat.id = 1
+    message.from_user = MagicMock(id=8, username=None, is_self=False)
+    assert config.matcher.match(message) == [config.match_cfgs[0]]
+    message.from_user.id = 7
+    assert config.matcher.match(message) == [
+        config.match_cfgs[0],
+        config.match_cfgs[2],
+    ]
+
+
+def test_compiled_matcher_is_not_serialized():
+    config = MonitorConfig(
+        match_cfgs=[
+            MatchConfig(
+                chat_id=1,
+                rule="regex",
+                rule_value=r"code (\d+)",
+                send_text_search_regex=r"code (\d+)",
+            )
+        ]
+    )
+    expected = config.to_jsonable()
+    message = MagicMock()
+    message.text = "code 42"
+    message.chat.id = 1
+    message.from_user = None
+    assert config.matcher.match(message) == config.match_cfgs
+    assert config.match_cfgs[0].get_send_text(message.text) == "42"
+    assert config.to_jsonable() == expected
+    json.dumps(config.to_jsonable())
+
+
+def _message(text, chat_id, username=None, user_id=1, user_name=None):
+    message = MagicMock()
+    message.text = text
+    message.chat.id = chat_id
+    message.chat.username = username
+    message.from_user = MagicMock(id=user_id, username=user_name, is_self=False)
+    return message
+
+
+def test_rule_matcher_buckets_by_resolved_chat_and_users():
+    cfgs = [
+        MatchConfig(chat_id="@Group", rule="contains", rule_value="a"),
+        MatchConfig(
+            chat_id=-100, rule="contains", rule_value="a", from_user_ids=["@alice"]
+        ),
+        MatchConfig(chat_id=-200, rule="all", forward_to_chat_id="@channel"),
+    ]
+    matcher = RuleMatcher(cfgs)
+    assert matcher.usernames() == ["alice", "channel", "group"]
+
+    # 未解析时按username比较
+    assert matcher.match(_message("a", -300, username="group")) == [cfgs[0]]
+    assert matcher.match(_message("a", -100, user_name="Alice")) == [cfgs[1]]
+    assert matcher.peer_id("@channel") == "@channel"
+
+    matcher.resolve({"group": -300, "alice": 42, "channel": -400})
+    assert matcher.match(_message("a", -300)) == [cfgs[0]]
+    assert matcher.match(_message("a", -100, user_id=42)) == [cfgs[1]]
+    assert matcher.match(_message("a", -100, user_id=43, user_name="alice")) == []
+    assert matcher.match(_message("b", -200)) == [cfgs[2]]
+    assert matcher.match_text("a", [-500]) == []
+    assert matcher.peer_id("@channel") == -400
+    assert matcher.peer_id(-200) == -200
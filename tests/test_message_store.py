@@ -0,0 +1,62 @@
+from pyrogram.types import (
+    Chat,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Message,
+)
+
+from tg_signer.message_store import MessageRecord, MessageRing
+
+
+def test_message_record_keeps_only_needed_fields():
+    message = Message(
+        id=1,
+        chat=Chat(id=100),
+        text="请选择",
+        reply_markup=InlineKeyboardMarkup(
+            [
+                [InlineKeyboardButton("签到", callback_data="sign")],
+                [InlineKeyboardButton("取消", callback_data="cancel")],
+            ]
+        ),
+    )
+    record = MessageRecord.from_message(message)
+    assert (record.id, record.chat_id, record.text, record.photo) == (
+        1,
+        100,
+        "请选择",
+        None,
+    )
+    assert list(record.flat_buttons()) == [("签到", "sign"), ("取消", "cancel")]
+    assert "签到 | " in record.readable()
+    assert not hasattr(record, "__dict__")
+
+
+def test_message_ring_is_bounded_and_tracks_versions():
+    ring = MessageRing(maxlen=3)
+    for i in range(10):
+        ring.put(MessageRecord(i, 100, f"m{i}"), float(i))
+    assert len(ring) == 3
+    assert ring.get(0) is None and ring.get(9).text == "m9"
+
+    # 游标之前已被丢弃的到达记录直接跳过
+    seq, record, arrived_at = ring.next_update(0)
+    assert (seq, record.id, arrived_at) == (8, 7, 7.0)
+
+    edited = MessageRecord(9, 100, "m9 edited")
+    old = ring.get(9)
+    ring.put(edited, 10.0)
+    assert not ring.is_latest(old) and ring.is_latest(edited)
+    ring.mark_handled(9)
+    assert ring[9] is None and not ring.is_latest(edited)
+
+    cursor = 0
+    seen = []
+    while (update := ring.next_update(cursor)) is not None:
+        cursor, record, _ = update
+        seen.append(record.text)
+    assert seen == ["m8", "m9", "m9 edited"]
+    assert ring.next_update(cursor) is None
+
+    ring.clear()
+    assert len(ring) == 0 and ring.next_update(0) is None
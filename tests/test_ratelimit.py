@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from pyrogram import errors, raw
+
+from tg_signer.ratelimit import RateLimiter, TokenBucket, get_peer_key
+
+
+def test_token_bucket_reserve():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # the third request must wait roughly one token interval
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+
+
+def test_token_bucket_penalize_and_recover():
+    bucket = TokenBucket(rate=10, capacity=2, backoff=0.5, recovery=0.5)
+    bucket.penalize(5)
+    assert bucket.rate == 5
+    assert bucket.reserve() >= 4.9
+    bucket.reward()
+    assert bucket.rate == 7.5
+
+
+def test_get_peer_key():
+    query = raw.functions.messages.SendMessage(
+        peer=raw.types.InputPeerChannel(channel_id=1, access_hash=2),
+        message="hi",
+        random_id=1,
+    )
+    assert get_peer_key(query) == ("channel", 1)
+    assert get_peer_key(raw.functions.updates.GetState()) is None
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_retries_flood_wait():
+    limiter = RateLimiter(chat_rate=100, max_retries=2)
+    attempts = []
+
+    async def func():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise errors.FloodWait(value=0)
+        return "ok"
+
+    assert await limiter.call(func, peer_key=("user", 1)) == "ok"
+    assert len(attempts) == 2
+    assert limiter.flood_waits == 1
+    # only the chat bucket is slowed down
+    assert limiter.chat_bucket(("user", 1)).rate < limiter.chat_rate
+    assert limiter.bucket.rate == limiter.bucket.base_rate
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_raises_long_flood_wait():
+    limiter = RateLimiter(max_flood_wait=10)
+
+    async def func():
+        raise errors.FloodWait(value=3600)
+
+    with pytest.raises(errors.FloodWait):
+        await limiter.call(func)
+    assert limiter.bucket.blocked_until > time.monotonic() + 3000
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+import pytest
+
+from tg_signer.core import get_now
+from tg_signer.scheduler import SignScheduler, discover_tasks, plan_offsets
+from tg_signer.supervisor import Supervisor
+
+
+def test_discover_tasks(tmp_path):
+    signs_dir = tmp_path / "signs"
+    (signs_dir / "plain").mkdir(parents=True)
+    (signs_dir / "plain" / "config.json").write_text(json.dumps({"chats": []}))
+    (signs_dir / "acc1" / "daily").mkdir(parents=True)
+    (signs_dir / "acc1" / "daily" / "config.json").write_text(
+        json.dumps({"account_name": "acc1", "chats": []})
+    )
+    (signs_dir / "empty").mkdir()
+
+    assert discover_tasks(signs_dir) == [("acc1/daily", "acc1"), ("plain", None)]
+    assert discover_tasks(tmp_path / "missing") == []
+
+
+class FakeSigner:
+    def __init__(self, account, task_name):
+        self._account = account
+        self.task_name = task_name
+        self.cycles = []
+        self.app = type("App", (), {"proxy": None})()
+
+    def load_config(self):
+        return type(
+            "Config",
+            (),
+            {
+                "chats": [],
+                "sign_at": "0 6 * * *",
+                "random_seconds": 0,
+                "precise": False,
+                "send_only": False,
+            },
+        )()
+
+    @staticmethod
+    def _validate_sign_at(sign_at):
+        return sign_at
+
+    @staticmethod
+    def uses_server_schedule(config):
+        return False
+
+    async def prepare_run(self, num_of_dialogs):
+        return self.load_config()
+
+    def add_message_handlers(self, chat_ids):
+        pass
+
+    async def run_cycle(self, config, fire_at=None):
+        self.cycles.append(time.time())
+        return get_now()
+
+    def get_next_run(self, config, now):
+        return now + timedelta(hours=1)
+
+    def log(self, msg, level="INFO"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_scheduler_fires_due_jobs_in_order(tmp_path):
+    scheduler = SignScheduler(
+        max_concurrency=1, status_file=tmp_path / "status.json", status_interval=60
+    )
+    late = FakeSigner("a", "late")
+    early = FakeSigner("b", "early")
+    scheduler.add(late, time.time() + 0.1)
+    scheduler.add(early)
+    assert scheduler.queue_depth == 2
+
+    runner = asyncio.create_task(scheduler.run_forever())
+    await asyncio.sleep(0.3)
+    runner.cancel()
+
+    assert len(early.cycles) == 1
+    assert len(late.cycles) == 1
+    assert early.cycles[0] < late.cycles[0]
+    # 两个任务都已重新入堆，等待下一个小时
+    assert scheduler.queue_depth == 2
+    assert scheduler.stats()["next_fire_in"] > 3000
+    scheduler.report_status()
+    assert json.loads((tmp_path / "status.json").read_text())["scheduled"] == 2
+
+
+def test_plan_offsets_spreads_evenly_and_deterministically():
+    items = [
+        {"key": f"acc{i}:task", "proxy": "direct", "targets": [i]} for i in range(4)
+    ]
+    offsets = plan_offsets(items, window=120)
+    assert sorted(offsets.values()) == [0, 30, 60, 90]
+    assert plan_offsets(list(reversed(items)), window=120) == offsets
+
+
+def test_plan_offsets_respects_limits():
+    items = [
+        {"key": f"acc{i}:task", "proxy": "socks5://p:1", "targets": [777]}
+        for i in range(3)
+    ]
+    offsets = plan_offsets(items, window=0, slot_seconds=10, max_per_target=1)
+    assert sorted(offsets.values()) == [0, 10, 20]
+
+    offsets = plan_offsets(items, window=0, slot_seconds=10, max_per_proxy=2)
+    assert sorted(offsets.values()) == [0, 0, 10]
+
+
+class BrokenSigner(FakeSigner):
+    def load_config(self):
+        raise ValueError("bad config")
+
+
+def test_scheduler_skips_tasks_with_broken_config(tmp_path):
+    scheduler = SignScheduler(status_file=tmp_path / "status.json")
+    assert scheduler.add(BrokenSigner("a", "broken")) is None
+    assert scheduler.add(FakeSigner("b", "ok")) is not None
+    assert scheduler.queue_depth == 1
+
+
+def test_scheduler_staggers_initial_runs(tmp_path):
+    scheduler = SignScheduler(status_file=tmp_path / "status.json", spread=False)
+    signer = FakeSigner("a", "task")
+    signer.load_config = lambda: type(
+        "Config", (), {"chats": [], "sign_at": "0 6 * * *", "random_seconds": 600}
+    )()
+    job = scheduler.add(signer)
+    explicit = scheduler.add(FakeSigner("b", "task"), fire_at=123)
+    start = time.time()
+    scheduler._stagger_initial()
+    fire_times = {j.key: t for t, _, j in scheduler._heap}
+    assert start <= fire_times[job.key] <= start + 600
+    assert fire_times[explicit.key] == 123
+
+
+@pytest.mark.asyncio
+async def test_scheduler_waits_for_pending_probe_without_spinning(tmp_path):
+    supervisor = Supervisor()
+    supervisor.probe_poll_interval = 0.1
+    breaker = supervisor.breaker("a")
+    # 冷却已结束，另一任务的试探正在进行
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+    assert breaker.allow()
+    scheduler = SignScheduler(
+        status_file=tmp_path / "status.json", spread=False, supervisor=supervisor
+    )
+    signer = FakeSigner("a", "task")
+    scheduler.add(signer, fire_at=time.time())
+    calls = 0
+    run_job = scheduler._run_job
+
+    async def counting_run_job(job):
+        nonlocal calls
+        calls += 1
+        await run_job(job)
+
+    scheduler._run_job = counting_run_job
+    runner = asyncio.create_task(scheduler.run_forever())
+    await asyncio.sleep(0.35)
+    runner.cancel()
+
+    assert 1 <= calls <= 5
+    assert not signer.cycles
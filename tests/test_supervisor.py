@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from tg_signer.supervisor import (
+    DEGRADED,
+    HALF_OPEN,
+    HEALTHY,
+    OPEN,
+    Backoff,
+    CircuitBreaker,
+    Supervisor,
+)
+
+
+def test_backoff_grows_exponentially_with_jitter():
+    backoff = Backoff(base=10, factor=2, max_delay=100, jitter=0.5)
+    assert backoff.delay(0) == 0
+    for failures, upper in [(1, 10), (2, 20), (3, 40), (10, 100)]:
+        delay = backoff.delay(failures)
+        assert upper / 2 <= delay <= upper
+
+
+def test_circuit_breaker_states():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, jitter=0)
+    assert breaker.state == HEALTHY
+    breaker.record_failure(OSError("proxy down"))
+    assert breaker.state == DEGRADED and breaker.allow()
+    breaker.record_failure(OSError("proxy down"))
+    assert breaker.state == OPEN and not breaker.allow()
+    assert 0 < breaker.retry_in() <= 0.05
+    assert breaker.stats()["last_error"] == "OSError: proxy down"
+
+    breaker.opened_at -= 0.05
+    assert breaker.state == HALF_OPEN and breaker.allow()
+    # 试探失败后冷却时间加倍
+    breaker.record_failure(OSError("proxy down"))
+    assert breaker.state == OPEN and breaker.reset_timeout == 0.1
+
+    breaker.record_success()
+    assert breaker.state == HEALTHY and breaker.reset_timeout == 0.05
+
+
+def test_circuit_breaker_admits_one_probe_and_escalates_only_on_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, jitter=0)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    # 熔断前已开始的调用失败，不延长冷却时间
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.reset_timeout == 10
+
+    breaker.opened_at -= 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.reset_timeout == 20
+
+    breaker.opened_at -= 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_gather_isolated_keeps_other_accounts_running():
+    supervisor = Supervisor(backoff=Backoff(base=0.01, jitter=0))
+    attempts = []
+
+    async def flaky():
+        attempts.append("flaky")
+        if len(attempts) < 2:
+            raise RuntimeError("boom")
+        return "flaky ok"
+
+    async def steady():
+        await asyncio.sleep(0.01)
+        return "steady ok"
+
+    results = await supervisor.gather_isolated([("a", flaky), ("b", steady)])
+    assert results == ["flaky ok", "steady ok"]
+    assert supervisor.health()["a"]["total_failures"] == 1
+    assert supervisor.health()["a"]["state"] == HEALTHY
+
+    async def broken():
+        raise RuntimeError("always")
+
+    results = await supervisor.gather_isolated(
+        [("c", broken), ("b", steady)], restart=False
+    )
+    assert results == [None, "steady ok"]
+    assert supervisor.health()["c"]["state"] == DEGRADED
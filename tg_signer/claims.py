@@ -0,0 +1,157 @@
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+CLAIM_RETENTION = 24 * 60 * 60  # 认领记录保留时间，单位秒
+
+
+class ClaimStore:
+    """
+    多个账号运行同一监控任务时，通过工作目录下的SQLite认领表协调：每条消息
+    (task, chat_id, message_id)只由最先认领的账号处理。
+
+    每个账号定期写入心跳，认领者超过``lease``秒没有心跳且尚未处理完成时，
+    其他账号可以接管其认领的消息。
+
+    各方法均为阻塞调用，可在线程中执行（内部加锁），数据库被锁定时最多等待``timeout``秒。
+    """
+
+    def __init__(
+        self,
+        file: Union[str, pathlib.Path],
+        owner: str,
+        task: str = "",
+        lease: float = 60,
+        timeout: float = 2,
+    ):
+        self.file = pathlib.Path(file)
+        self.owner = owner
+        self.task = task
+        self.lease = lease
+        self.timeout = timeout
+        self.claimed = 0
+        self.skipped = 0
+        self.taken_over = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.file,
+                isolation_level=None,
+                timeout=self.timeout,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS claims ("
+                "task TEXT, chat_id INTEGER, message_id INTEGER, owner TEXT, "
+                "claimed_at REAL, done INTEGER DEFAULT 0, "
+                "PRIMARY KEY (task, chat_id, message_id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS heartbeats ("
+                "task TEXT, owner TEXT, seen_at REAL, PRIMARY KEY (task, owner))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def heartbeat(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            conn = self.conn
+            conn.execute(
+                "INSERT OR REPLACE INTO heartbeats VALUES (?, ?, ?)",
+                (self.task, self.owner, now),
+            )
+            conn.execute(
+                "DELETE FROM claims WHERE task = ? AND claimed_at < ?",
+                (self.task, now - CLAIM_RETENTION),
+            )
+
+    def claim(
+        self,
+        chat_id: int,
+        message_id: int,
+        now: Optional[float] = None,
+        recheck: bool = False,
+    ) -> bool:
+        """
+        认领一条消息，返回是否由本账号处理。已被其他在线账号认领或已处理完成时返回False；
+        认领者已离线（心跳超时）且未完成时接管并返回True。
+
+        ``recheck``为True表示租约到期后再次检查之前未认领到的消息，不重复计入skipped。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._claim(chat_id, message_id, now, recheck)
+
+    def _claim(self, chat_id: int, message_id: int, now: float, recheck: bool) -> bool:
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT claims.owner, claims.done, heartbeats.seen_at FROM claims "
+                "LEFT JOIN heartbeats ON heartbeats.task = claims.task "
+                "AND heartbeats.owner = claims.owner "
+                "WHERE claims.task = ? AND claims.chat_id = ? AND claims.message_id = ?",
+                (self.task, chat_id, message_id),
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO claims VALUES (?, ?, ?, ?, ?, 0)",
+                    (self.task, chat_id, message_id, self.owner, now),
+                )
+                self.claimed += 1
+                result = True
+            else:
+                owner, done, seen_at = row
+                if owner == self.owner:
+                    result = not done
+                elif done or (seen_at is not None and now - seen_at < self.lease):
+                    if not recheck:
+                        self.skipped += 1
+                    result = False
+                else:
+                    conn.execute(
+                        "UPDATE claims SET owner = ?, claimed_at = ? "
+                        "WHERE task = ? AND chat_id = ? AND message_id = ?",
+                        (self.owner, now, self.task, chat_id, message_id),
+                    )
+                    self.taken_over += 1
+                    result = True
+            conn.execute(
+                "INSERT OR REPLACE INTO heartbeats VALUES (?, ?, ?)",
+                (self.task, self.owner, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def complete(self, chat_id: int, message_id: int):
+        """本账号已处理完成，其他账号不再接管"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE claims SET done = 1 "
+                "WHERE task = ? AND chat_id = ? AND message_id = ? AND owner = ?",
+                (self.task, chat_id, message_id, self.owner),
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "claimed": self.claimed,
+            "skipped": self.skipped,
+            "taken_over": self.taken_over,
+        }
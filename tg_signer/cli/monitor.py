@@ -5,7 +5,7 @@ from typing import Optional
 import click
 from click import Group
 
-from tg_signer.core import UserMonitor
+from tg_signer.core import LOGIN_CACHE_TTL, UserMonitor
 
 from .signer import tg_signer
 
@@ -22,6 +22,7 @@ def get_monitor(
         session_string=ctx_obj["session_string"],
         in_memory=ctx_obj["in_memory"],
         loop=loop,
+        login_cache_ttl=ctx_obj.get("login_cache_ttl", LOGIN_CACHE_TTL),
     )
     return monitor
 
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import logging
 import os
 from typing import Optional
@@ -6,7 +7,8 @@ from typing import Optional
 import click
 from click import Context, HelpFormatter
 
-from tg_signer.core import UserSigner, get_proxy
+from tg_signer.core import LOGIN_CACHE_TTL, UserSigner, get_proxy
+from tg_signer.supervisor import get_supervisor
 
 
 class AliasedGroup(click.Group):
@@ -53,6 +55,8 @@ def get_signer(
         session_string=ctx_obj["session_string"],
         in_memory=ctx_obj["in_memory"],
         loop=loop,
+        keep_alive_horizon=ctx_obj.get("keep_alive", 0),
+        login_cache_ttl=ctx_obj.get("login_cache_ttl", LOGIN_CACHE_TTL),
     )
     return signer
 
@@ -136,6 +140,26 @@ def get_signer(
     is_flag=True,
     help="是否将session存储在内存中，默认为False，存储在文件",
 )
+@click.option(
+    "--keep-alive",
+    "keep_alive",
+    default=0,
+    show_default=True,
+    show_envvar=True,
+    envvar="TG_KEEP_ALIVE",
+    type=float,
+    help="秒, 下次签到在该时间内时两次签到之间保持Telegram连接，避免重复建立连接, 0表示每次签到后断开",
+)
+@click.option(
+    "--login-cache-ttl",
+    "login_cache_ttl",
+    default=LOGIN_CACHE_TTL,
+    show_default=True,
+    show_envvar=True,
+    envvar="TG_LOGIN_CACHE_TTL",
+    type=float,
+    help="秒, 用户信息和最近对话列表的缓存有效期，有效期内运行任务时不再获取对话列表, 0表示不使用缓存",
+)
 @click.pass_context
 def tg_signer(
     ctx: click.Context,
@@ -148,6 +172,8 @@ def tg_signer(
     workdir: str,
     session_string: str,
     in_memory: bool,
+    keep_alive: float,
+    login_cache_ttl: float,
 ):
     from tg_signer.logger import configure_logger
 
@@ -173,6 +199,8 @@ def tg_signer(
     ctx.obj["workdir"] = workdir
     ctx.obj["session_string"] = session_string
     ctx.obj["in_memory"] = in_memory
+    ctx.obj["keep_alive"] = keep_alive
+    ctx.obj["login_cache_ttl"] = login_cache_ttl
 
 
 @tg_signer.command(help="Show version")
@@ -227,11 +255,12 @@ def run(obj, task_names, num_of_dialogs):
         raise click.UsageError("At least one task name is required")
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    coros = []
+    jobs = []
     for task_name in task_names:
         signer = get_signer(task_name, obj, loop=loop)
-        coros.append(signer.run(num_of_dialogs))
-    loop.run_until_complete(asyncio.gather(*coros))
+        jobs.append((signer._account, functools.partial(signer.run, num_of_dialogs)))
+    # 各任务相互隔离，单个任务异常后按退避时间重启，不影响其他任务
+    loop.run_until_complete(get_supervisor().gather_isolated(jobs))
 
 
 @tg_signer.command(help="运行一次签到任务，即使该签到任务今日已执行过")
@@ -444,12 +473,139 @@ def multi_run(obj, accounts, task_name, num_of_dialogs):
     logger.info(f"开始使用一套配置({task_name})同时运行多个账号..")
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    coros = []
+    jobs = []
     for account in accounts:
         obj["account"] = account
         signer = get_signer(task_name, obj, loop=loop)
-        coros.append(signer.run(num_of_dialogs))
-    loop.run_until_complete(asyncio.gather(*coros))
+        jobs.append((account, functools.partial(signer.run, num_of_dialogs)))
+    # 各账号相互隔离，单个账号异常后按退避时间重启，不影响其他账号
+    loop.run_until_complete(get_supervisor().gather_isolated(jobs))
+
+
+@tg_signer.command(
+    help="""以单进程调度器运行多个账号的多个签到任务。\n\n未指定任务时运行工作目录下的所有任务；
+    任务配置中含有`account_name`时使用该账号，否则使用`--account`指定的账号（可多个）"""
+)
+@click.argument("task_names", nargs=-1)
+@click.option(
+    "--account",
+    "-a",
+    "accounts",
+    multiple=True,
+    help="未在任务配置中指定账号时使用的账号，可多个，默认为全局`--account`",
+)
+@click.option(
+    "--num-of-dialogs",
+    "-n",
+    default=50,
+    show_default=True,
+    type=int,
+    help="获取最近N个对话, 请确保想要签到的对话在最近N个对话内",
+)
+@click.option(
+    "--max-concurrency",
+    "-c",
+    "max_concurrency",
+    default=10,
+    show_default=True,
+    type=int,
+    help="同时执行的签到任务数量上限",
+)
+@click.option(
+    "--status-interval",
+    "status_interval",
+    default=60,
+    show_default=True,
+    type=float,
+    help="输出调度器状态（队列深度等）的间隔秒数，同时写入工作目录下的`daemon_status.json`",
+)
+@click.option(
+    "--spread/--no-spread",
+    "spread",
+    default=True,
+    show_default=True,
+    help="为同一时刻触发的任务在随机秒数窗口内分配均匀且固定的启动偏移，替代各自随机延迟",
+)
+@click.option(
+    "--slot-seconds",
+    "slot_seconds",
+    default=30,
+    show_default=True,
+    type=float,
+    help="分配启动偏移时估计的单个任务执行时长",
+)
+@click.option(
+    "--max-per-proxy",
+    "max_per_proxy",
+    default=0,
+    show_default=True,
+    type=int,
+    help="同一代理同时执行的任务数上限, 0表示不限制",
+)
+@click.option(
+    "--max-per-target",
+    "max_per_target",
+    default=0,
+    show_default=True,
+    type=int,
+    help="同一签到目标（chat_id）同时执行的任务数上限, 0表示不限制",
+)
+@click.option(
+    "--show-plan",
+    "show_plan",
+    default=False,
+    is_flag=True,
+    help="仅输出计算得到的启动计划，不运行",
+)
+@click.pass_obj
+def daemon(
+    obj,
+    task_names,
+    accounts,
+    num_of_dialogs,
+    max_concurrency,
+    status_interval,
+    spread,
+    slot_seconds,
+    max_per_proxy,
+    max_per_target,
+    show_plan,
+):
+    import pathlib
+
+    from tg_signer.scheduler import SignScheduler, discover_tasks
+
+    logger = logging.getLogger("tg-signer")
+    workdir = pathlib.Path(obj["workdir"])
+    tasks = discover_tasks(workdir / UserSigner._tasks_dir)
+    if task_names:
+        tasks = [t for t in tasks if t[0] in task_names]
+    if not tasks:
+        raise click.UsageError("没有找到可运行的签到任务")
+    default_accounts = accounts or (obj["account"],)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    scheduler = SignScheduler(
+        max_concurrency=max_concurrency,
+        num_of_dialogs=num_of_dialogs,
+        status_file=workdir / "daemon_status.json",
+        status_interval=status_interval,
+        spread=spread,
+        slot_seconds=slot_seconds,
+        max_per_proxy=max_per_proxy,
+        max_per_target=max_per_target,
+    )
+    for task_name, account in tasks:
+        for acc in (account,) if account else default_accounts:
+            signer = get_signer(task_name, {**obj, "account": acc}, loop=loop)
+            scheduler.add(signer)
+    if show_plan:
+        import json
+
+        click.echo(json.dumps(scheduler.plan(), ensure_ascii=False, indent=2))
+        return
+    logger.info(f"调度器已加载{scheduler.queue_depth}个任务")
+    loop.run_until_complete(scheduler.run_forever())
 
 
 @tg_signer.command(name="llm-config", help="配置大模型API")
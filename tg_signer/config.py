@@ -13,10 +13,12 @@ from typing import (
     Union,
 )
 
-from pydantic import AnyHttpUrl, BaseModel, ValidationError
+from pydantic import AnyHttpUrl, BaseModel, PrivateAttr, ValidationError, validator
 from pyrogram.types import Chat, Message
 from typing_extensions import Self, TypeAlias
 
+from .matcher import RuleMatcher
+
 
 def get_display_width(text: str) -> int:
     """计算文本在终端中的显示宽度（考虑中文字符占2个字符位）"""
@@ -319,6 +321,11 @@ class SignChatV3(BaseJSONConfig):
         }
         return any(action.action in ai_actions for action in self.actions)
 
+    @property
+    def send_only(self) -> bool:
+        send_actions = {SupportAction.SEND_TEXT, SupportAction.SEND_DICE}
+        return all(action.action in send_actions for action in self.actions)
+
 
 class SignConfigV3(BaseJSONConfig):
     version: ClassVar = 3
@@ -330,11 +337,35 @@ class SignConfigV3(BaseJSONConfig):
     sign_at: str  # 签到时间，time或crontab表达式
     random_seconds: int = 0
     sign_interval: int = 1  # 连续签到的间隔时间，单位秒
+    max_concurrent_chats: int = 1  # 同时签到的Chat数量上限，1表示逐个签到
+    precise: bool = False  # 精确时间模式，提前连接并在签到时间准时发送第一个动作
+    precise_lead_seconds: int = 30  # 精确时间模式下提前连接的秒数
+    # 根据历史响应耗时自适应等待超时，收到响应后立即执行下一个动作
+    adaptive_timeout: bool = False
+    # >0时，只发送文本/骰子且不删除消息的任务提前安排N天的Telegram定时消息，无需每天连接
+    server_schedule_days: int = 0
+    server_schedule_low_days: int = 2  # 已安排的定时消息不足N天时补充
+
+    @validator("max_concurrent_chats")
+    def _check_max_concurrent_chats(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError("max_concurrent_chats不能小于1")
+        return v
 
     @property
     def requires_ai(self) -> bool:
         return any(chat.requires_ai for chat in self.chats)
 
+    @property
+    def send_only(self) -> bool:
+        """只发送消息，不需要接收任何更新"""
+        return all(chat.send_only for chat in self.chats)
+
+    @property
+    def server_schedulable(self) -> bool:
+        """可以完全由Telegram定时消息完成（定时消息无法在发送后删除）"""
+        return self.send_only and all(chat.delete_after is None for chat in self.chats)
+
 
 MatchRuleT: TypeAlias = Literal["exact", "contains", "regex", "all"]
 
@@ -374,6 +405,9 @@ class MatchConfig(BaseJSONConfig):
     )
     push_via_server_chan: bool = False  # 将消息通过server酱推送
     server_chan_send_key: Optional[str] = None  # server酱的sendkey
+    # 预编译的正则，不参与序列化
+    _rule_pattern: Optional[re.Pattern] = PrivateAttr(None)
+    _send_text_pattern: Optional[re.Pattern] = PrivateAttr(None)
 
     def __str__(self):
         return (
@@ -410,6 +444,25 @@ class MatchConfig(BaseJSONConfig):
             or ("me" in self.from_user_set and message.from_user.is_self)
         )
 
+    @property
+    def rule_pattern(self) -> Optional[re.Pattern]:
+        """预编译的regex规则"""
+        if self.rule != "regex" or self.rule_value is None:
+            return None
+        if self._rule_pattern is None:
+            self._rule_pattern = re.compile(
+                self.rule_value, re.IGNORECASE if self.ignore_case else 0
+            )
+        return self._rule_pattern
+
+    @property
+    def send_text_pattern(self) -> Optional[re.Pattern]:
+        if not self.send_text_search_regex:
+            return None
+        if self._send_text_pattern is None:
+            self._send_text_pattern = re.compile(self.send_text_search_regex)
+        return self._send_text_pattern
+
     def match_text(self, text: str) -> bool:
         """
         根据`rule`校验`text`是否匹配
@@ -426,8 +479,7 @@ class MatchConfig(BaseJSONConfig):
                 return rule_value.lower() in text.lower()
             return rule_value in text
         elif self.rule == "regex":
-            flags = re.IGNORECASE if self.ignore_case else 0
-            return bool(re.search(rule_value, text, flags=flags))
+            return bool(self.rule_pattern.search(text))
         return False
 
     def match_chat(self, chat: "Chat"):
@@ -442,8 +494,8 @@ class MatchConfig(BaseJSONConfig):
 
     def get_send_text(self, text: str) -> str:
         send_text = self.default_send_text
-        if self.send_text_search_regex:
-            m = re.search(self.send_text_search_regex, text)
+        if self.send_text_pattern:
+            m = self.send_text_pattern.search(text)
             if not m:
                 return send_text
             try:
@@ -465,6 +517,16 @@ class MonitorConfig(BaseJSONConfig):
     version: ClassVar = 1
     is_current: ClassVar = True
     match_cfgs: List[MatchConfig]
+    max_workers: int = 4  # 同时处理匹配消息的最大数量，同一Chat的消息按顺序处理
+    max_queue_size: int = 100  # 每个Chat最多排队的消息数，超出时丢弃最早的
+    dedup_window: int = 0  # 重复消息抑制窗口，单位秒，0表示不去重
+    # 去重范围: global-所有Chat内相同文本只处理一次, chat-同一Chat内, rule-同一监控项内
+    dedup_scope: Literal["global", "chat", "rule"] = "global"
+    dedup_persist: bool = False  # 保存去重记录，重启后继续生效
+    # 多个账号运行同一监控任务时，通过工作目录下的认领表使每条消息只由一个账号处理
+    coordinate_accounts: bool = False
+    claim_lease: int = 60  # 认领账号超过该秒数没有心跳时，由其他账号接管
+    _matcher: Optional[RuleMatcher] = PrivateAttr(None)  # 不参与序列化
 
     @property
     def chat_ids(self):
@@ -473,3 +535,10 @@ class MonitorConfig(BaseJSONConfig):
     @property
     def requires_ai(self) -> bool:
         return any(cfg.requires_ai for cfg in self.match_cfgs)
+
+    @property
+    def matcher(self) -> RuleMatcher:
+        """由所有监控项编译而成的匹配器"""
+        if self._matcher is None:
+            self._matcher = RuleMatcher(self.match_cfgs)
+        return self._matcher
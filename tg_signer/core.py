@@ -1,4 +1,7 @@
 import asyncio
+import contextlib
+import functools
+import heapq
 import json
 import logging
 import os
@@ -10,8 +13,12 @@ from collections import Counter, defaultdict
 from datetime import datetime, timedelta, timezone
 from datetime import time as dt_time
 from typing import (
+    Awaitable,
     BinaryIO,
+    Callable,
     Generic,
+    Hashable,
+    Iterable,
     List,
     Optional,
     Type,
@@ -24,15 +31,16 @@ import httpx
 from croniter import CroniterBadCronError, croniter
 from pydantic import BaseModel, ValidationError
 from pyrogram import Client as BaseClient
-from pyrogram import errors, filters
+from pyrogram import errors, filters, raw
+from pyrogram import utils as pyrogram_utils
 from pyrogram.enums import ChatMembersFilter, ChatType
 from pyrogram.handlers import EditedMessageHandler, MessageHandler
+from pyrogram.handlers.handler import Handler
 from pyrogram.methods.utilities.idle import idle
 from pyrogram.session import Session
 from pyrogram.storage import MemoryStorage
 from pyrogram.types import (
     Chat,
-    InlineKeyboardButton,
     InlineKeyboardMarkup,
     Message,
     Object,
@@ -57,7 +65,15 @@ from tg_signer.config import (
 )
 
 from .ai_tools import AITools, OpenAIConfigManager
+from .claims import ClaimStore
+from .dedup import DedupWindow
+from .dispatch import ChatDispatcher
+from .journal import SignJournal
+from .latency import LatencyStats
+from .message_store import MessageRecord, MessageRing
 from .notification.server_chan import sc_send
+from .ratelimit import RateLimiter, get_peer_key
+from .supervisor import get_supervisor
 from .utils import UserInput, print_to_user
 
 # Monkeypatch sqlite3.connect to increase default timeout
@@ -74,6 +90,23 @@ logger = logging.getLogger("tg-signer")
 
 DICE_EMOJIS = ("🎲", "🎯", "🏀", "⚽", "🎳", "🎰")
 
+KEEP_ALIVE_GRACE = 60  # 保持连接时在下次运行时间之后额外保留的秒数
+LOGIN_CACHE_TTL = 24 * 60 * 60  # 登录信息（用户信息及最近对话）缓存的有效期，单位秒
+DEFAULT_ACTION_TIMEOUT = 10  # 等待Bot响应的默认超时时间，单位秒
+PEER_REFRESH_INTERVAL = 6 * 60 * 60  # 监控规则中username重新解析的间隔，单位秒
+MONITOR_STATS_INTERVAL = 5 * 60  # 监控时输出消息处理统计的间隔，单位秒
+DEDUP_SAVE_INTERVAL = 60  # 去重记录保存到文件的间隔，单位秒
+MAX_SCHEDULED_MESSAGES = 100  # Telegram每个Chat最多100条定时消息
+SCHEDULE_MIN_LEAD = 60  # 定时消息的发送时间至少在该秒数之后
+STALE_UPDATE_GRACE = 120  # 判断过期更新时允许的时间误差，单位秒
+# 带有message且需要按Chat过滤的更新类型
+_MESSAGE_UPDATES = (
+    raw.types.UpdateNewMessage,
+    raw.types.UpdateEditMessage,
+    raw.types.UpdateNewChannelMessage,
+    raw.types.UpdateEditChannelMessage,
+)
+
 Session.START_TIMEOUT = 5  # 原始超时时间为2秒，但一些代理访问会超时，所以这里调大一点
 
 OPENAI_USE_PROMPT = "当前任务需要配置大模型，请确保运行前正确设置`OPENAI_API_KEY`, `OPENAI_BASE_URL`, `OPENAI_MODEL`等环境变量，或通过`tg-signer llm-config`持久化配置。"
@@ -118,42 +151,306 @@ _CLIENT_INSTANCES: dict[str, "Client"] = {}
 # so multiple coroutines in the same process can safely share one Client.
 _CLIENT_REFS: defaultdict[str, int] = defaultdict(int)
 _CLIENT_ASYNC_LOCKS: dict[str, asyncio.Lock] = {}
+# 最近一次建立连接（connect到start完成）的耗时，单位秒
+_CLIENT_CONNECT_LATENCIES: dict[str, float] = {}
+# 最近一次建立连接各阶段的耗时，单位秒
+_CLIENT_CONNECT_PHASES: dict[str, dict[str, float]] = {}
+# 已设置过PRAGMA的session文件
+_STORAGE_PRAGMAS_APPLIED: set[str] = set()
+
+
+PHASE_NAMES = {"connect": "连接", "auth": "授权验证", "start": "启动"}
 
 
 class Client(BaseClient):
     def __init__(self, name: str, *args, **kwargs):
         key = kwargs.pop("key", None)
+        rate_limiter = kwargs.pop("rate_limiter", None)
+        if rate_limiter is not None:
+            # 所有FloodWait都交给rate_limiter处理，以便其学习并调整速率
+            kwargs.setdefault("sleep_threshold", 0)
         super().__init__(name, *args, **kwargs)
+        self.rate_limiter: Optional[RateLimiter] = rate_limiter
         self.key = key or str(pathlib.Path(self.workdir).joinpath(self.name).resolve())
         if self.in_memory and not self.session_string:
             self.load_session_string()
             self.storage = MemoryStorage(self.name, self.session_string)
+        self._linger_until = 0.0  # 最后一个使用者退出后，保持连接直到该时刻(monotonic)
+        self._warm = False  # 已无使用者但仍保持着连接
+        self._idle_stop_task: Optional[asyncio.Task] = None
+        # 已注册的处理函数, (类型, 回调, group) -> (handler, group)
+        self._handlers: dict[tuple, tuple[Handler, int]] = {}
+        # 未过期的缓存身份信息，启动时据此跳过get_me
+        self.cached_me: Optional[User] = None
+        # 本次连接的开始时间，早于此时间的消息更新（补收的旧更新）直接丢弃
+        self.updates_since: Optional[float] = None
+        # 服务器时间减本地时间，由收到的更新中的服务器时间估计，未知时为None
+        self.server_time_offset: Optional[float] = None
+        self.stale_updates = 0  # 已丢弃的旧更新数量
+        # 各使用者关注的Chat, 使用者 -> chat id集合(None表示需要全部消息)
+        self._watched_peers: dict[Hashable, Optional[frozenset]] = {}
+        self.filtered_updates = 0  # 因不属于关注的Chat而丢弃的消息更新数量
+
+    async def start(self):
+        """
+        非交互式的快速启动：
+
+        - 会话未授权时直接报错，不进入交互式登录
+        - 用一次``updates.GetState``同时完成授权校验和更新状态的初始化
+        - 有``cached_me``时不再调用``get_me``
+        - 各阶段耗时记录在``_CLIENT_CONNECT_PHASES``
+        """
+        phases = {}
+        t = time.perf_counter()
+        self.load_plugins()
+        is_authorized = await self.connect()
+        phases["connect"] = time.perf_counter() - t
+        try:
+            if not is_authorized:
+                # Prevent interactive login attempt
+                raise ConnectionError("Session invalid: not authorized")
+            t = time.perf_counter()
+            try:
+                await self.invoke(raw.functions.updates.GetState())
+            except errors.Unauthorized as e:
+                raise ConnectionError(f"Session invalid: {e}")
+            phases["auth"] = time.perf_counter() - t
+            t = time.perf_counter()
+            self.me = self.cached_me or await self.get_me()
+            await self.initialize()
+            phases["start"] = time.perf_counter() - t
+        except BaseException:
+            await self.disconnect()
+            raise
+        self._apply_storage_pragmas()
+        _CLIENT_CONNECT_PHASES[self.key] = phases
+        return self
+
+    def _apply_storage_pragmas(self):
+        conn = getattr(self.storage, "conn", None)
+        if conn is None:
+            return
+        # journal_mode=WAL会持久化到数据库文件，每个session文件只需设置一次
+        database = str(getattr(self.storage, "database", self.key))
+        if database in _STORAGE_PRAGMAS_APPLIED:
+            return
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            _STORAGE_PRAGMAS_APPLIED.add(database)
+        except Exception as e:
+            logger.error(f"Failed to enable WAL mode: {e}")
+
+    def add_handler(self, handler: Handler, group: int = 0):
+        """
+        注册处理函数。同一类型、同一回调在同一group中只保留一个，重复注册时替换为新的
+        （例如过滤条件变化）；断开连接会清空dispatcher中的处理函数，重新连接后自动恢复。
+        """
+        key = (type(handler), handler.callback, group)
+        old = self._handlers.get(key)
+        if old is not None:
+            if old[0] is handler:
+                return handler, group
+            self._discard_handler(*old)
+        self._handlers[key] = (handler, group)
+        return super().add_handler(handler, group)
+
+    def remove_handler(self, handler: Handler, group: int = 0):
+        key = (type(handler), handler.callback, group)
+        registered = self._handlers.pop(key, None)
+        if registered is not None:
+            self._discard_handler(*registered)
+
+    def _discard_handler(self, handler: Handler, group: int):
+        # 与dispatcher.add_handler一样在任务中修改，保证与尚未完成的添加保持顺序
+        async def fn():
+            for lock in self.dispatcher.locks_list:
+                await lock.acquire()
+            try:
+                handlers = self.dispatcher.groups.get(group)
+                if handlers and handler in handlers:
+                    handlers.remove(handler)
+            finally:
+                for lock in self.dispatcher.locks_list:
+                    lock.release()
+
+        self.loop.create_task(fn())
+
+    def _restore_handlers(self):
+        for handler, group in self._handlers.values():
+            if handler not in self.dispatcher.groups.get(group, ()):
+                super().add_handler(handler, group)
+
+    @property
+    def handler_count(self) -> int:
+        """当前注册的处理函数数量"""
+        return len(self._handlers)
+
+    def keep_alive(self, seconds: float):
+        """最后一个使用者退出后，继续保持连接`seconds`秒，期间再次进入可直接复用连接"""
+        self._linger_until = max(self._linger_until, time.monotonic() + seconds)
+
+    async def invoke(self, query, *args, **kwargs):
+        invoke = super().invoke
+        if self.rate_limiter is None:
+            return await invoke(query, *args, **kwargs)
+        return await self.rate_limiter.call(
+            lambda: invoke(query, *args, **kwargs), peer_key=get_peer_key(query)
+        )
+
+    @property
+    def connect_latency(self) -> Optional[float]:
+        return _CLIENT_CONNECT_LATENCIES.get(self.key)
+
+    def watch_peers(self, owner: Hashable, chat_ids: Optional[Iterable] = None):
+        """
+        登记``owner``需要接收消息的Chat。所有使用者都登记了chat id后，其他Chat的
+        消息更新在解析为``Message``之前即被丢弃；``chat_ids``为None或含有无法直接
+        对应到id的username时，不做过滤。
+        """
+        peers = None
+        if chat_ids is not None:
+            peers = set()
+            for chat_id in chat_ids:
+                if chat_id in ("me", "self") and self.me:
+                    chat_id = self.me.id
+                if not isinstance(chat_id, int):
+                    peers = None
+                    break
+                peers.add(chat_id)
+        self._watched_peers[owner] = None if peers is None else frozenset(peers)
+
+    def unwatch_peers(self, owner: Hashable):
+        self._watched_peers.pop(owner, None)
+
+    @property
+    def watched_peers(self) -> Optional[frozenset]:
+        """需要接收消息的Chat id集合，None表示不过滤"""
+        if not self._watched_peers:
+            return None
+        peers = set()
+        for chat_ids in self._watched_peers.values():
+            if chat_ids is None:
+                return None
+            peers |= chat_ids
+        return frozenset(peers)
+
+    def server_time(self, local_time: float) -> float:
+        """本地时间对应的服务器时间，避免本机时钟偏差导致误判"""
+        return local_time + (self.server_time_offset or 0)
+
+    async def handle_updates(self, updates):
+        if self.no_updates:
+            # 精简模式：丢弃服务器主动推送的更新，也不写入其中的peer
+            return
+        if isinstance(
+            updates,
+            (raw.types.Updates, raw.types.UpdatesCombined, raw.types.UpdateShort),
+        ):
+            # 这些更新的date为服务器发出时的时间
+            self.server_time_offset = updates.date - time.time()
+        watched = self.watched_peers
+        if self.updates_since is None and watched is None:
+            return await super().handle_updates(updates)
+        # 不补收连接之前的消息，也不解析无关Chat的消息，
+        # 也就不会为它们发起getDifference等请求
+        if isinstance(updates, (raw.types.Updates, raw.types.UpdatesCombined)):
+            kept = [u for u in updates.updates if self._keep_update(u, watched)]
+            if not kept:
+                return
+            updates.updates = kept
+        elif isinstance(
+            updates, (raw.types.UpdateShortMessage, raw.types.UpdateShortChatMessage)
+        ):
+            if not self._keep_update(updates, watched):
+                return
+        return await super().handle_updates(updates)
+
+    def _keep_update(self, update, watched: Optional[frozenset]) -> bool:
+        if isinstance(update, raw.types.UpdateShortMessage):
+            date, peer_id = update.date, update.user_id
+        elif isinstance(update, raw.types.UpdateShortChatMessage):
+            date, peer_id = update.date, -update.chat_id
+        else:
+            message = getattr(update, "message", None)
+            date = getattr(message, "edit_date", None) or getattr(message, "date", None)
+            peer = getattr(message, "peer_id", None)
+            peer_id = None
+            if isinstance(update, _MESSAGE_UPDATES) and peer is not None:
+                peer_id = pyrogram_utils.get_peer_id(peer)
+        if (
+            self.updates_since is not None
+            and date is not None
+            and date < self.server_time(self.updates_since) - STALE_UPDATE_GRACE
+        ):
+            self.stale_updates += 1
+            logger.info(f"丢弃连接之前的旧更新: {type(update).__name__}, date={date}")
+            return False
+        if watched is not None and peer_id is not None and peer_id not in watched:
+            self.filtered_updates += 1
+            return False
+        return True
+
+    @contextlib.asynccontextmanager
+    async def connected(self, lite: bool = False):
+        """
+        与``async with client``相同，``lite=True``时若需要新建连接则使用精简模式：
+        不接收更新、不启动dispatcher的消息处理协程。
+        已有连接时复用，精简模式的连接在有使用者需要更新时会升级为完整模式。
+        """
+        await self.acquire(lite)
+        try:
+            yield self
+        finally:
+            await self.__aexit__(None, None, None)
 
     async def __aenter__(self):
+        return await self.acquire()
+
+    async def acquire(self, lite: bool = False):
         lock = _CLIENT_ASYNC_LOCKS.get(self.key)
         if lock is None:
             lock = asyncio.Lock()
             _CLIENT_ASYNC_LOCKS[self.key] = lock
         async with lock:
             _CLIENT_REFS[self.key] += 1
+            fresh = _CLIENT_REFS[self.key] == 1 and not self._warm
+            if not fresh and not lite and self.no_updates:
+                self.no_updates = False
+                logger.info(f"账户「{self.name}」切换为完整模式")
+                if self.is_initialized:
+                    await self.dispatcher.start()
             if _CLIENT_REFS[self.key] == 1:
+                if self._idle_stop_task is not None:
+                    self._idle_stop_task.cancel()
+                    self._idle_stop_task = None
+                if self._warm:
+                    self._warm = False
+                    logger.info(f"复用已保持的连接: {self.name}")
+                    return self
+                self.no_updates = lite
+                if lite:
+                    logger.info(
+                        f"账户「{self.name}」使用精简模式连接: 不接收更新, "
+                        f"不启动{self.workers}个消息处理协程"
+                    )
+                start = time.perf_counter()
+                self.updates_since = time.time()
                 try:
-                    await self.connect()
-                    try:
-                        await self.get_me()
-                    except Exception as e:
-                        # Prevent interactive login attempt
-                        raise ConnectionError(f"Session invalid: {e}")
-
                     await self.start()
-                    # Enable WAL mode after start
-                    if hasattr(self, "storage") and hasattr(self.storage, "conn"):
-                        try:
-                            self.storage.conn.execute("PRAGMA journal_mode=WAL")
-                        except Exception as e:
-                            logger.error(f"Failed to enable WAL mode: {e}")
-                except ConnectionError:
-                    pass
+                except BaseException:
+                    _CLIENT_REFS[self.key] -= 1
+                    raise
+                self._restore_handlers()
+                latency = time.perf_counter() - start
+                _CLIENT_CONNECT_LATENCIES[self.key] = latency
+                phases = _CLIENT_CONNECT_PHASES.get(self.key, {})
+                detail = ", ".join(
+                    f"{PHASE_NAMES.get(k, k)}{v:.3f}秒" for k, v in phases.items()
+                )
+                logger.info(
+                    f"账户「{self.name}」连接耗时: {latency:.3f}秒"
+                    + (f" ({detail})" if detail else "")
+                )
             return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -163,11 +460,31 @@ class Client(BaseClient):
         async with lock:
             _CLIENT_REFS[self.key] -= 1
             if _CLIENT_REFS[self.key] == 0:
-                try:
-                    await self.stop()
-                except ConnectionError:
-                    pass
-                _CLIENT_INSTANCES.pop(self.key, None)
+                linger = self._linger_until - time.monotonic()
+                if linger > 0:
+                    logger.info(f"账户「{self.name}」保持连接{linger:.0f}秒")
+                    self._warm = True
+                    self._idle_stop_task = asyncio.create_task(
+                        self._stop_when_idle(linger)
+                    )
+                    return
+                await self._stop()
+
+    async def _stop_when_idle(self, delay: float):
+        await asyncio.sleep(delay)
+        async with _CLIENT_ASYNC_LOCKS[self.key]:
+            if _CLIENT_REFS[self.key] == 0 and self._warm:
+                logger.info(f"账户「{self.name}」空闲超时，断开连接")
+                self._idle_stop_task = None
+                await self._stop()
+
+    async def _stop(self):
+        self._warm = False
+        try:
+            await self.stop()
+        except ConnectionError:
+            pass
+        _CLIENT_INSTANCES.pop(self.key, None)
 
     @property
     def session_string_file(self):
@@ -226,6 +543,7 @@ def get_client(
     key = str(pathlib.Path(workdir).joinpath(name).resolve())
     if key in _CLIENT_INSTANCES:
         return _CLIENT_INSTANCES[key]
+    kwargs.setdefault("rate_limiter", RateLimiter())
     client = Client(
         name,
         api_id=api_id,
@@ -245,6 +563,39 @@ def get_now():
     return datetime.now(tz=timezone(timedelta(hours=8)))
 
 
+def _ignore_task_exception(task: asyncio.Task):
+    """后台任务的异常由等待方处理，未被等待时避免"exception was never retrieved"警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+class ResourceUsage:
+    """记录进程CPU时间及内存（RSS）的变化"""
+
+    def __init__(self):
+        self.cpu = time.process_time()
+        self.rss = self.current_rss()
+
+    @staticmethod
+    def current_rss() -> Optional[int]:
+        """当前RSS，单位字节，不支持的平台返回None"""
+        try:
+            with open("/proc/self/statm", "r") as fp:
+                return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+    def report(self) -> str:
+        cpu = time.process_time() - self.cpu
+        rss = self.current_rss()
+        if rss is None or self.rss is None:
+            return f"CPU {cpu:.3f}秒"
+        mb = 1024 * 1024
+        return (
+            f"CPU {cpu:.3f}秒, 内存 {rss / mb:.1f}MB ({(rss - self.rss) / mb:+.1f}MB)"
+        )
+
+
 def make_dirs(path: pathlib.Path, exist_ok=True):
     path = pathlib.Path(path)
     if not path.is_dir():
@@ -252,6 +603,111 @@ def make_dirs(path: pathlib.Path, exist_ok=True):
     return path
 
 
+class MessageDeleter:
+    """
+    按账户延迟批量删除消息。
+
+    `schedule`只记录(chat_id, message_id, 到期时间)并立即返回，后台协程在消息到期后
+    对每个Chat调用一次`delete_messages`批量删除。待删除的消息会写入文件，进程重启后
+    再次连接时继续删除。
+    """
+
+    batch_size = 100  # 单次delete_messages的最大消息数
+    coalesce_window = 1  # 秒, 到期时间相近的消息合并到同一批删除
+
+    def __init__(self, client: Client, store_file: pathlib.Path):
+        self.client = client
+        self.store_file = pathlib.Path(store_file)
+        self._pending: list[tuple[float, int, int]] = []  # 最小堆
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._load()
+
+    def _load(self):
+        if not self.store_file.is_file():
+            return
+        try:
+            with open(self.store_file, "r", encoding="utf-8") as fp:
+                self._pending = [tuple(item) for item in json.load(fp)]
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"读取待删除消息失败: {e}")
+            self._pending = []
+        heapq.heapify(self._pending)
+
+    def _save(self):
+        make_dirs(self.store_file.parent)
+        with open(self.store_file, "w", encoding="utf-8") as fp:
+            json.dump(self._pending, fp)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        heapq.heappush(self._pending, (time.time() + delay, chat_id, message_id))
+        self._save()
+        self._changed.set()
+        self.start()
+
+    def start(self):
+        """启动后台删除协程，需在客户端连接期间调用"""
+        if self._pending and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def drain(self):
+        """等待所有待删除的消息删除完成（或因连接错误中止）"""
+        self.start()
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _run(self):
+        while self._pending:
+            delay = self._pending[0][0] - time.time()
+            if delay > 0:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due: dict[int, list[int]] = defaultdict(list)
+            now = time.time()
+            while self._pending and self._pending[0][0] <= now + self.coalesce_window:
+                _, chat_id, message_id = heapq.heappop(self._pending)
+                due[chat_id].append(message_id)
+            try:
+                for chat_id, message_ids in due.items():
+                    for i in range(0, len(message_ids), self.batch_size):
+                        batch = message_ids[i : i + self.batch_size]
+                        try:
+                            await self.client.delete_messages(chat_id, batch)
+                            logger.info(f"已删除Chat {chat_id}的消息: {batch}")
+                        except errors.RPCError as e:
+                            logger.error(f"删除Chat {chat_id}的消息{batch}失败: {e}")
+                    due[chat_id] = []
+            except (OSError, ConnectionError) as e:
+                # 连接不可用，保留未删除的消息等待下次连接
+                logger.warning(f"删除消息时连接异常，稍后重试: {e}")
+                for chat_id, message_ids in due.items():
+                    for message_id in message_ids:
+                        heapq.heappush(self._pending, (now, chat_id, message_id))
+                self._save()
+                return
+            self._save()
+
+
+_MESSAGE_DELETERS: dict[str, MessageDeleter] = {}
+
+
+def get_message_deleter(client: Client, store_file: pathlib.Path) -> MessageDeleter:
+    """同一存储文件共用一个删除队列，避免同一账户的多个任务互相覆盖"""
+    key = str(pathlib.Path(store_file).resolve())
+    deleter = _MESSAGE_DELETERS.get(key)
+    if deleter is None or deleter.client is not client:
+        deleter = MessageDeleter(client, store_file)
+        _MESSAGE_DELETERS[key] = deleter
+    return deleter
+
+
 ConfigT = TypeVar("ConfigT", bound=BaseJSONConfig)
 
 
@@ -271,7 +727,13 @@ class BaseUserWorker(Generic[ConfigT]):
         in_memory: bool = False,
         *,
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        keep_alive_horizon: float = 0,
+        login_cache_ttl: float = LOGIN_CACHE_TTL,
     ):
+        """
+        :param keep_alive_horizon: 秒, 下次运行在该时间内时两次运行之间保持连接, ``0`` 表示每次运行后断开.
+        :param login_cache_ttl: 秒, 登录信息缓存的有效期, ``0`` 表示每次运行都重新登录.
+        """
         self.task_name = task_name or "my_task"
         self._session_dir = pathlib.Path(session_dir)
         self._account = account
@@ -287,6 +749,8 @@ class BaseUserWorker(Generic[ConfigT]):
             loop=loop,
         )
         self.loop = self.app.loop
+        self.keep_alive_horizon = keep_alive_horizon
+        self.login_cache_ttl = login_cache_ttl
         self.user: Optional[User] = None
         self._config = None
         self.context = self.ensure_ctx()
@@ -396,7 +860,8 @@ class BaseUserWorker(Generic[ConfigT]):
         self.log("开始登录...")
         app = self.app
         async with app:
-            me = await app.get_me()
+            # 启动时已获取
+            me = app.me or await app.get_me()
             self.set_me(me)
             latest_chats = []
             async for dialog in app.get_dialogs(num_of_dialogs):
@@ -427,6 +892,75 @@ class BaseUserWorker(Generic[ConfigT]):
                     ensure_ascii=False,
                 )
             await self.app.save_session_string()
+            self.write_login_cache(me, [c["id"] for c in latest_chats])
+
+    @property
+    def login_cache_file(self) -> pathlib.Path:
+        return make_dirs(self.workdir / "accounts") / f"{self._account}.login.json"
+
+    def write_login_cache(self, me: User, chat_ids: List[int]):
+        cache = {
+            "cached_at": time.time(),
+            "me": {
+                "id": me.id,
+                "is_bot": me.is_bot,
+                "username": me.username,
+                "first_name": me.first_name,
+                "last_name": me.last_name,
+            },
+            "chat_ids": chat_ids,
+        }
+        with open(self.login_cache_file, "w", encoding="utf-8") as fp:
+            json.dump(cache, fp, ensure_ascii=False)
+
+    def load_login_cache(self) -> Optional[dict]:
+        if self.login_cache_ttl <= 0 or not self.login_cache_file.is_file():
+            return None
+        try:
+            with open(self.login_cache_file, "r", encoding="utf-8") as fp:
+                cache = json.load(fp)
+            if (
+                time.time() - cache["cached_at"] > self.login_cache_ttl
+                or "id" not in cache["me"]
+            ):
+                return None
+        except (ValueError, KeyError, TypeError):
+            return None
+        return cache
+
+    async def ensure_login(
+        self,
+        num_of_dialogs=20,
+        chat_ids: List[Union[int, str]] = None,
+        print_chat=True,
+    ):
+        """
+        优先使用未过期的登录缓存，仅当缓存过期或有未见过的Chat时才重新登录获取对话列表
+        """
+        if self.user is not None:
+            return
+        # 内存中的session不会保存peers，必须通过获取对话列表来认识各个Chat
+        if not (self.app.in_memory or self.app.session_string):
+            cache = self.load_login_cache()
+            if cache is not None:
+                known = set(cache.get("chat_ids") or [])
+                unknown = [
+                    c for c in chat_ids or [] if isinstance(c, int) and c not in known
+                ]
+                if not unknown:
+                    self.user = User(is_self=True, **cache["me"])
+                    self.app.cached_me = self.user
+                    self.log("使用缓存的登录信息，跳过获取对话列表")
+                    return
+                self.log(f"登录缓存中没有以下Chat, 重新登录: {unknown}")
+        await self.login(num_of_dialogs, print_chat=print_chat)
+
+    @property
+    def message_deleter(self) -> MessageDeleter:
+        return get_message_deleter(
+            self.app,
+            self.workdir / "accounts" / f"{self._account}.deletions.json",
+        )
 
     async def logout(self):
         self.log("开始登出...")
@@ -444,6 +978,7 @@ class BaseUserWorker(Generic[ConfigT]):
         :param chat_id:
         :param text:
         :param delete_after: 秒, 发送消息后进行删除，``None`` 表示不删除, ``0`` 表示立即删除.
+            删除由`message_deleter`在后台进行，不会阻塞调用方.
         :param kwargs:
         :return:
         """
@@ -452,10 +987,7 @@ class BaseUserWorker(Generic[ConfigT]):
             self.log(
                 f"Message「{text}」 to {chat_id} will be deleted after {delete_after} seconds."
             )
-            self.log("Waiting...")
-            await asyncio.sleep(delete_after)
-            await message.delete()
-            self.log(f"Message「{text}」 to {chat_id} deleted!")
+            self.message_deleter.schedule(message.chat.id, message.id, delete_after)
         return message
 
     async def send_dice(
@@ -484,13 +1016,7 @@ class BaseUserWorker(Generic[ConfigT]):
             self.log(
                 f"Dice「{emoji}」 to {chat_id} will be deleted after {delete_after} seconds."
             )
-            self.log("Waiting...")
-            await asyncio.sleep(delete_after)
-            try:
-                await message.delete()
-                self.log(f"Dice「{emoji}」 to {chat_id} deleted!")
-            except Exception as e:
-                self.log(f"删除骰子消息失败: {e}", level="ERROR")
+            self.message_deleter.schedule(message.chat.id, message.id, delete_after)
         return message
 
     async def search_members(
@@ -580,8 +1106,15 @@ class UserSignerWorkerContext(BaseModel):
 
     waiter: Waiter
     sign_chats: dict  # 签到配置列表, int -> list[SignChatV3]
-    chat_messages: dict  # 收到的消息, int -> dict[int, Optional[Message]]
-    waiting_message: Optional[Message] = None  # 正在处理的消息
+    chat_messages: dict  # 收到的消息及到达（含编辑）顺序, int -> MessageRing
+    chat_events: dict  # 新消息通知, int -> asyncio.Event
+    waiting_messages: dict  # 各Chat正在处理的消息, int -> MessageRecord
+    prefired: set = set()  # 已在精确时间模式下发送了第一个动作的Chat, id(SignChatV3)
+    pending_actions: dict = {}  # 各Chat当前待执行的动作, int -> ActionT
+    started_at: float = 0  # 本轮签到开始时间，之前的消息（含编辑）不处理
+    journal: Optional[SignJournal] = None  # 本轮签到的进度日志
+    # 各Chat提前开始的图片下载或大模型调用（每个待执行动作至多一个）, int -> (MessageRecord, Task)
+    prefetches: dict = {}
 
 
 class UserSigner(BaseUserWorker[SignConfigV3]):
@@ -589,13 +1122,19 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
     _tasks_dir = "signs"
     cfg_cls = SignConfigV3
     context: UserSignerWorkerContext
+    _latency_stats: Optional[LatencyStats] = None
+    _message_handlers: List[Handler] = []
 
     def ensure_ctx(self) -> UserSignerWorkerContext:
         return UserSignerWorkerContext(
             waiter=Waiter(),
             sign_chats=defaultdict(list),
-            chat_messages=defaultdict(dict),
-            waiting_message=None,
+            chat_messages=defaultdict(MessageRing),
+            chat_events=defaultdict(asyncio.Event),
+            waiting_messages={},
+            prefired=set(),
+            pending_actions={},
+            prefetches={},
         )
 
     @property
@@ -743,16 +1282,102 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
                 sign_record = json.load(fp)
         return sign_record
 
+    @property
+    def latency_stats(self) -> LatencyStats:
+        """各Chat、各动作的Bot响应耗时，保存在签到记录同目录下"""
+        if self._latency_stats is None:
+            self._latency_stats = LatencyStats(
+                self.sign_record_file.with_name("latency_stats.json")
+            )
+        return self._latency_stats
+
+    @property
+    def journal_file(self) -> pathlib.Path:
+        return self.sign_record_file.with_name("sign_journal.jsonl")
+
+    def open_journal(
+        self, config: SignConfigV3, now: datetime, force_rerun: bool = False
+    ) -> SignJournal:
+        """
+        打开本轮签到的进度日志。上次签到中途中断且仍处于同一签到周期（尚未到下次签到时间）时，
+        继续使用其进度，跳过已完成的Chat和动作。
+        """
+        journal = SignJournal(self.journal_file)
+        started_at = journal.load()
+        resume = False
+        if started_at is not None and not force_rerun:
+            cron_it = croniter(self._validate_sign_at(config.sign_at), started_at)
+            resume = cron_it.next(datetime) > now
+        journal.begin(now, config.chats, resume=resume)
+        if resume:
+            finished = sum(
+                journal.done_actions(chat) >= len(chat.actions) for chat in config.chats
+            )
+            self.log(
+                f"从上次中断处继续（{started_at}开始）: "
+                f"已完成{finished}/{len(config.chats)}个Chat"
+            )
+        return journal
+
+    def _checkpoint(self, chat: SignChatV3, done: int):
+        if self.context.journal is not None:
+            self.context.journal.record(chat, done)
+
+    def _done_actions(self, chat: SignChatV3) -> int:
+        done = 0
+        if self.context.journal is not None:
+            done = self.context.journal.done_actions(chat)
+        if id(chat) in self.context.prefired:
+            # 第一个动作已在精确时间发送
+            done = max(done, 1)
+        return done
+
     async def sign_a_chat(
         self,
         chat: SignChatV3,
+        adaptive_timeout: bool = False,
     ):
+        """
+        :param adaptive_timeout: 根据历史响应耗时决定等待超时时间，且等待响应的动作前不再
+            额外等待``action_interval``，收到响应即执行
+        """
         self.log(f"开始执行: \n{chat}")
-        for action in chat.actions:
+        start = self._done_actions(chat)
+        if start:
+            self.log(f"跳过已完成的{start}个动作")
+        try:
+            await self._sign_a_chat(chat, start, adaptive_timeout)
+        finally:
+            self.context.pending_actions.pop(chat.chat_id, None)
+            self._cancel_prefetches(chat.chat_id)
+
+    async def _sign_a_chat(
+        self, chat: SignChatV3, start: int, adaptive_timeout: bool = False
+    ):
+        last_done = time.monotonic()
+        for index in range(start, len(chat.actions)):
+            action = chat.actions[index]
+            response_action = not isinstance(action, (SendTextAction, SendDiceAction))
+            # 等待间隔期间到达的消息也可提前开始处理
+            self.context.pending_actions[chat.chat_id] = action
+            if index > start and not (adaptive_timeout and response_action):
+                await asyncio.sleep(chat.action_interval)
             self.log(f"等待处理动作: {action}")
-            await self.wait_for(chat, action)
+            key = LatencyStats.make_key(chat.chat_id, index, action)
+            timeout = DEFAULT_ACTION_TIMEOUT
+            if adaptive_timeout and response_action:
+                timeout = self.latency_stats.timeout(key, DEFAULT_ACTION_TIMEOUT)
+                self.log(f"等待超时时间: {timeout:.1f}秒")
+            result = await self.wait_for(chat, action, timeout)
+            if response_action:
+                # 超时也作为样本，使慢响应的Bot的超时时间逐步放宽
+                done_at = result if result is not None else time.monotonic()
+                self.latency_stats.record(key, done_at - last_done)
             self.log(f"处理完成: {action}")
-            self.context.waiting_message = None
+            self._checkpoint(chat, index + 1)
+            self.context.waiting_messages.pop(chat.chat_id, None)
+            last_done = time.monotonic()
+        if not adaptive_timeout:
             await asyncio.sleep(chat.action_interval)
 
     async def run(
@@ -774,84 +1399,472 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
                 num_of_dialogs, only_once=only_once, force_rerun=force_rerun
             )
 
-    async def normal_run(
-        self, num_of_dialogs=20, only_once: bool = False, force_rerun: bool = False
-    ):
-        if self.user is None:
-            await self.login(num_of_dialogs, print_chat=True)
-
+    async def prepare_run(self, num_of_dialogs=20) -> SignConfigV3:
+        """登录并加载配置，返回签到配置"""
         config = self.load_config(self.cfg_cls)
+        await self.ensure_login(
+            num_of_dialogs, chat_ids=[c.chat_id for c in config.chats]
+        )
         if config.requires_ai:
             self.ensure_ai_cfg()
+        return config
 
-        sign_record = self.load_sign_record()
-        chat_ids = [c.chat_id for c in config.chats]
+    def add_message_handlers(self, chat_ids: List[int]):
+        """添加消息回调处理函数，重复调用不会重复添加"""
+        self.log(f"为以下Chat添加消息回调处理函数：{chat_ids}")
+        self._message_handlers = [
+            MessageHandler(self.on_message, filters.chat(chat_ids)),
+            EditedMessageHandler(self.on_edited_message, filters.chat(chat_ids)),
+        ]
+        for handler in self._message_handlers:
+            self.app.add_handler(handler)
+        self.app.watch_peers(self, chat_ids)
+        self.log(f"当前处理函数数量: {self.app.handler_count}")
+
+    def remove_message_handlers(self):
+        for handler in self._message_handlers:
+            self.app.remove_handler(handler)
+        self._message_handlers = []
+        self.app.unwatch_peers(self)
+
+    def need_sign(
+        self,
+        config: SignConfigV3,
+        sign_record: dict,
+        now: datetime,
+        force_rerun: bool = False,
+    ) -> bool:
+        if force_rerun:
+            return True
+        last_date_str = str(now.date())
+        if last_date_str not in sign_record:
+            return True
+        _last_sign_at = datetime.fromisoformat(sign_record[last_date_str])
+        self.log(f"上次执行时间: {_last_sign_at}")
+        _cron_it = croniter(self._validate_sign_at(config.sign_at), _last_sign_at)
+        _next_run: datetime = _cron_it.next(datetime)
+        if _next_run > now:
+            self.log("当前未到下次执行时间，无需执行")
+            return False
+        return True
+
+    def get_next_run(self, config: SignConfigV3, now: datetime) -> datetime:
+        cron_it = croniter(self._validate_sign_at(config.sign_at), now)
+        return cron_it.next(datetime) + timedelta(
+            seconds=random.randint(0, int(config.random_seconds))
+        )
 
-        async def sign_once():
-            for chat in config.chats:
-                self.context.sign_chats[chat.chat_id].append(chat)
+    async def _sign_lane(
+        self,
+        config: SignConfigV3,
+        chats: List[SignChatV3],
+        semaphore: asyncio.Semaphore,
+    ):
+        for chat in chats:
+            if self._done_actions(chat) >= len(chat.actions):
+                self.log(f"已完成，跳过: chat {chat.chat_id}")
+                continue
+            async with semaphore:
+                self._register_sign_chat(chat)
                 try:
-                    await self.sign_a_chat(chat)
+                    await self.sign_a_chat(
+                        chat, adaptive_timeout=config.adaptive_timeout
+                    )
                 except errors.RPCError as _e:
                     self.log(f"签到失败: {_e} \nchat: \n{chat}")
                     logger.warning(_e, exc_info=True)
                     continue
 
                 self.context.chat_messages[chat.chat_id].clear()
-                await asyncio.sleep(config.sign_interval)
-            sign_record[str(now.date())] = now.isoformat()
-            with open(self.sign_record_file, "w", encoding="utf-8") as fp:
-                json.dump(sign_record, fp)
+            # 间隔期间释放名额，其他lane可以继续签到
+            await asyncio.sleep(config.sign_interval)
+
+    def _register_sign_chat(self, chat: SignChatV3):
+        """登记正在签到的Chat，之后才会处理该Chat的消息"""
+        chats = self.context.sign_chats[chat.chat_id]
+        if not any(c is chat for c in chats):
+            chats.append(chat)
+
+    async def sign_once(self, config: SignConfigV3, sign_record: dict, now: datetime):
+        if config.max_concurrent_chats > 1:
+            # 同一chat_id的配置共享消息流，须在同一lane中按顺序执行
+            lanes: dict[int, List[SignChatV3]] = defaultdict(list)
+            for chat in config.chats:
+                lanes[chat.chat_id].append(chat)
+            self.log(
+                f"并发签到: {len(lanes)}个lane，最大并发数{config.max_concurrent_chats}"
+            )
+        else:
+            lanes = {0: config.chats}
+        semaphore = asyncio.Semaphore(config.max_concurrent_chats)
+        await asyncio.gather(
+            *(self._sign_lane(config, chats, semaphore) for chats in lanes.values())
+        )
+        sign_record[str(now.date())] = now.isoformat()
+        with open(self.sign_record_file, "w", encoding="utf-8") as fp:
+            json.dump(sign_record, fp)
+        if self.context.journal is not None:
+            self.context.journal.finish()
+        self.latency_stats.save()
+
+    async def run_cycle(
+        self,
+        config: SignConfigV3,
+        only_once: bool = False,
+        force_rerun: bool = False,
+        fire_at: Optional[datetime] = None,
+    ) -> datetime:
+        """
+        执行一轮签到，无需签到时不会连接Telegram
+        :param fire_at: 精确时间模式下的签到时间，调用方应提前`precise_lead_seconds`秒调用
+        :return: 本轮的当前时间
+        """
+        now = get_now()
+        if fire_at is not None:
+            now = max(now, fire_at)
+        self.log(f"当前时间: {now}")
+        sign_record = self.load_sign_record()
+        if not self.need_sign(config, sign_record, now, force_rerun):
+            return now
+        lite = config.send_only
+        usage = ResourceUsage()
+        async with self.app.connected(lite=lite):
+            self.context = self.ensure_ctx()
+            self.context.started_at = time.time()
+            # 继续删除上次运行遗留的到期消息
+            self.message_deleter.start()
+            if only_once and config.random_seconds > 0:
+                delay = random.randint(0, int(config.random_seconds))
+                if delay > 0:
+                    self.log(f"单次执行随机延迟: {delay} 秒")
+                    await asyncio.sleep(delay)
+            self.context.prefired.clear()
+            self.context.journal = self.open_journal(config, now, force_rerun)
+            try:
+                if config.precise and fire_at is not None:
+                    await self.precise_fire(config, fire_at)
+                await self.sign_once(config, sign_record, now)
+            finally:
+                self.context.journal.close()
+            await self.message_deleter.drain()
+            if not only_once:
+                self._keep_alive_until_next_run(config)
+        self.log(
+            f"本轮资源占用({'精简模式' if lite else '完整模式'}): {usage.report()}"
+        )
+        return now
 
-        def need_sign(last_date_str):
-            if force_rerun:
-                return True
-            if last_date_str not in sign_record:
-                return True
-            _last_sign_at = datetime.fromisoformat(sign_record[last_date_str])
-            self.log(f"上次执行时间: {_last_sign_at}")
-            _cron_it = croniter(self._validate_sign_at(config.sign_at), _last_sign_at)
-            _next_run: datetime = _cron_it.next(datetime)
-            if _next_run > now:
-                self.log("当前未到下次执行时间，无需执行")
-                return False
-            return True
+    def _keep_alive_until_next_run(self, config: SignConfigV3):
+        if self.keep_alive_horizon <= 0:
+            return
+        now = get_now()
+        cron_it = croniter(self._validate_sign_at(config.sign_at), now)
+        # 随机延迟最长为random_seconds，额外预留一些时间给下次运行的准备工作
+        seconds = (cron_it.next(datetime) - now).total_seconds() + int(
+            config.random_seconds
+        )
+        if seconds <= self.keep_alive_horizon:
+            self.app.keep_alive(seconds + KEEP_ALIVE_GRACE)
 
+    async def normal_run(
+        self, num_of_dialogs=20, only_once: bool = False, force_rerun: bool = False
+    ):
+        config = await self.prepare_run(num_of_dialogs)
+        chat_ids = [c.chat_id for c in config.chats]
+        if not config.send_only:
+            self.add_message_handlers(chat_ids)
+        try:
+            await self._run_loop(config, only_once, force_rerun)
+        finally:
+            self.remove_message_handlers()
+
+    async def _run_loop(
+        self, config: SignConfigV3, only_once: bool = False, force_rerun: bool = False
+    ):
+        if not force_rerun and self.uses_server_schedule(config):
+            return await self._server_schedule_loop(config, only_once)
+        fire_at = None
+        supervisor = get_supervisor()
         while True:
-            self.log(f"为以下Chat添加消息回调处理函数：{chat_ids}")
-            self.app.add_handler(
-                MessageHandler(self.on_message, filters.chat(chat_ids))
-            )
-            self.app.add_handler(
-                EditedMessageHandler(self.on_edited_message, filters.chat(chat_ids))
-            )
+            await supervisor.wait_until_allowed(self._account)
             try:
-                async with self.app:
-                    now = get_now()
-                    self.log(f"当前时间: {now}")
-                    now_date_str = str(now.date())
-                    self.context = self.ensure_ctx()
-                    if need_sign(now_date_str):
-                        if only_once and config.random_seconds > 0:
-                            delay = random.randint(0, int(config.random_seconds))
-                            if delay > 0:
-                                self.log(f"单次执行随机延迟: {delay} 秒")
-                                await asyncio.sleep(delay)
-                        await sign_once()
-
+                now = await self.run_cycle(
+                    config,
+                    only_once=only_once,
+                    force_rerun=force_rerun,
+                    fire_at=fire_at,
+                )
             except (OSError, errors.Unauthorized) as e:
-                logger.exception(e)
-                await asyncio.sleep(30)
+                logger.debug(e, exc_info=True)
+                await asyncio.sleep(supervisor.record_failure(self._account, e))
                 continue
+            supervisor.record_success(self._account)
 
             if only_once:
                 break
-            cron_it = croniter(self._validate_sign_at(config.sign_at), now)
-            next_run: datetime = cron_it.next(datetime) + timedelta(
-                seconds=random.randint(0, int(config.random_seconds))
-            )
+            next_run = self.get_next_run(config, now)
             self.log(f"下次运行时间: {next_run}")
-            await asyncio.sleep((next_run - now).total_seconds())
+            wait = (next_run - now).total_seconds()
+            if config.precise:
+                # 提前连接，由precise_fire在准确时间发送
+                fire_at = next_run
+                wait -= config.precise_lead_seconds
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def uses_server_schedule(config: SignConfigV3) -> bool:
+        return config.server_schedule_days > 0 and config.server_schedulable
+
+    @property
+    def server_schedule_file(self) -> pathlib.Path:
+        return self.sign_record_file.with_name("server_schedule.json")
+
+    async def _server_schedule_loop(self, config: SignConfigV3, only_once: bool):
+        supervisor = get_supervisor()
+        while True:
+            await supervisor.wait_until_allowed(self._account)
+            try:
+                next_check = await self.sync_server_schedule(config)
+            except (OSError, errors.Unauthorized) as e:
+                logger.debug(e, exc_info=True)
+                await asyncio.sleep(supervisor.record_failure(self._account, e))
+                continue
+            supervisor.record_success(self._account)
+            if only_once:
+                break
+            self.log(f"下次检查定时消息时间: {next_check}")
+            await asyncio.sleep(
+                max(SCHEDULE_MIN_LEAD, (next_check - get_now()).total_seconds())
+            )
+
+    async def sync_server_schedule(
+        self, config: SignConfigV3, force: bool = False
+    ) -> datetime:
+        """
+        将未来``server_schedule_days``天的签到安排为Telegram定时消息，返回下次需要补充的时间。
+
+        本地记录已安排到的时间，剩余天数不少于``server_schedule_low_days``时不连接Telegram；
+        补充前先与服务器上已有的定时消息核对，避免重复安排。
+        """
+        now = get_now()
+        low = timedelta(days=config.server_schedule_low_days)
+        covered_until = None
+        if not force and self.server_schedule_file.is_file():
+            try:
+                with open(self.server_schedule_file, "r", encoding="utf-8") as fp:
+                    covered_until = datetime.fromisoformat(
+                        json.load(fp)["covered_until"]
+                    )
+            except (OSError, ValueError, KeyError, TypeError):
+                covered_until = None
+        if covered_until is not None and covered_until - now > low:
+            self.log(f"定时消息已安排至{covered_until}，无需连接")
+            return covered_until - low
+
+        horizon = now + timedelta(days=config.server_schedule_days)
+        async with self.app.connected(lite=True):
+            covered = [
+                await self._top_up_chat_schedule(config, chat, now, horizon)
+                for chat in config.chats
+            ]
+        covered_until = min(covered, default=horizon)
+        with open(self.server_schedule_file, "w", encoding="utf-8") as fp:
+            json.dump(
+                {
+                    "covered_until": covered_until.isoformat(),
+                    "synced_at": now.isoformat(),
+                },
+                fp,
+            )
+        self.log(f"定时消息已安排至{covered_until}")
+        # 因数量上限未能覆盖到低水位之后时，在已覆盖的时间到达后再补充
+        return max(covered_until - low, min(covered_until, now + low))
+
+    @staticmethod
+    def _same_content(message: Message, action: ActionT) -> bool:
+        if isinstance(action, SendTextAction):
+            return message.text == action.text
+        if isinstance(action, SendDiceAction):
+            return (
+                message.dice is not None and message.dice.emoji == action.dice.strip()
+            )
+        return False
+
+    async def _top_up_chat_schedule(
+        self, config: SignConfigV3, chat: SignChatV3, now: datetime, horizon: datetime
+    ) -> datetime:
+        """补充一个Chat的定时消息，返回已覆盖到的时间"""
+        existing = await self.app.get_scheduled_messages(chat.chat_id)
+        slots = MAX_SCHEDULED_MESSAGES - len(existing)
+        # 同一次签到的消息在该时间范围内发送
+        window = (
+            int(config.random_seconds)
+            + chat.action_interval * len(chat.actions)
+            + SCHEDULE_MIN_LEAD
+        )
+        cron_it = croniter(
+            self._validate_sign_at(config.sign_at),
+            now + timedelta(seconds=SCHEDULE_MIN_LEAD),
+        )
+        scheduled = 0
+        while (fire_at := cron_it.next(datetime)) <= horizon:
+            start = fire_at.timestamp()
+            offset = random.randint(0, int(config.random_seconds))
+            missing = []
+            for index, action in enumerate(chat.actions):
+                if any(
+                    self._same_content(m, action)
+                    and start <= m.date.timestamp() <= start + window
+                    for m in existing
+                ):
+                    continue
+                missing.append(
+                    (
+                        fire_at
+                        + timedelta(seconds=offset + index * chat.action_interval),
+                        action,
+                    )
+                )
+            if len(missing) > slots:
+                self.log(
+                    f"Chat {chat.chat_id}的定时消息已达上限{MAX_SCHEDULED_MESSAGES}条，"
+                    f"只安排到{fire_at}之前",
+                    level="WARNING",
+                )
+                break
+            for at, action in missing:
+                if isinstance(action, SendTextAction):
+                    await self.app.send_message(
+                        chat.chat_id, action.text, schedule_date=at
+                    )
+                else:
+                    await self.app.send_dice(
+                        chat.chat_id, action.dice.strip(), schedule_date=at
+                    )
+                slots -= 1
+                scheduled += 1
+        else:
+            fire_at = horizon
+        self.log(
+            f"Chat {chat.chat_id}: 已有定时消息{len(existing)}条，新安排{scheduled}条"
+        )
+        return fire_at
+
+    async def estimate_server_time_offset(self, samples: int = 5) -> float:
+        """
+        估计Telegram服务器时间与本地时间的差值（服务器时间 - 本地时间），单位秒。
+
+        ``help.GetConfig``返回的服务器时间精确到秒，每次采样可得到差值所在的区间，
+        多次采样（错开请求时刻）后取区间交集的中点。
+        """
+        low, high = float("-inf"), float("inf")
+        mids = []
+        for i in range(samples):
+            t0 = time.time()
+            cfg = await self.app.invoke(raw.functions.help.GetConfig())
+            t1 = time.time()
+            low = max(low, cfg.date - t1)
+            high = min(high, cfg.date + 1 - t0)
+            mids.append(cfg.date + 0.5 - (t0 + t1) / 2)
+            if i < samples - 1:
+                await asyncio.sleep(1 / samples + random.random() * 0.1)
+        if low <= high:
+            return (low + high) / 2
+        # 区间不相交（网络抖动），退化为平均值
+        return sum(mids) / len(mids)
+
+    async def _build_first_request(self, chat: SignChatV3):
+        action = chat.actions[0]
+        peer = await self.app.resolve_peer(chat.chat_id)
+        if isinstance(action, SendTextAction):
+            message, entities = (
+                await pyrogram_utils.parse_text_entities(
+                    self.app, action.text, None, None
+                )
+            ).values()
+            return raw.functions.messages.SendMessage(
+                peer=peer,
+                message=message,
+                entities=entities,
+                random_id=self.app.rnd_id(),
+            )
+        if isinstance(action, SendDiceAction):
+            return raw.functions.messages.SendMedia(
+                peer=peer,
+                media=raw.types.InputMediaDice(emoticon=action.dice.strip()),
+                message="",
+                random_id=self.app.rnd_id(),
+            )
+        return None
+
+    @staticmethod
+    def _sent_message_info(result) -> tuple[Optional[int], Optional[int]]:
+        """从发送结果中取出(message_id, 服务器时间)"""
+        if isinstance(result, raw.types.UpdateShortSentMessage):
+            return result.id, result.date
+        for update in getattr(result, "updates", []):
+            if isinstance(
+                update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)
+            ):
+                return update.message.id, update.message.date
+        return None, None
+
+    async def precise_fire(self, config: SignConfigV3, fire_at: datetime):
+        """
+        精确时间模式：提前解析peer、估计服务器时间差并构造好第一个动作的请求，
+        在单调时钟上等待到服务器时间的``fire_at``时刻同时发出，并报告发送时间误差。
+        """
+        requests = []
+        for chat in config.chats:
+            if self._done_actions(chat):
+                continue
+            try:
+                request = await self._build_first_request(chat)
+            except (errors.RPCError, KeyError, ValueError) as e:
+                self.log(f"预构造请求失败: {e}\nchat: \n{chat}", level="WARNING")
+                continue
+            if request is not None:
+                requests.append((chat, request))
+        if not requests:
+            self.log("没有可提前发送的动作，精确时间模式不生效", level="WARNING")
+            return
+        # 发送前登记，Bot对第一个动作的回复才不会被忽略
+        if not self.context.started_at:
+            self.context.started_at = time.time()
+        for chat, _ in requests:
+            self._register_sign_chat(chat)
+        offset = await self.estimate_server_time_offset()
+        self.log(f"服务器时间差: {offset:+.3f}秒")
+        # 服务器时间的fire_at对应的本地时间，再换算为单调时钟
+        target = time.monotonic() + (fire_at.timestamp() - offset - time.time())
+        remaining = target - time.monotonic()
+        if remaining > 0.05:
+            await asyncio.sleep(remaining - 0.05)
+        while time.monotonic() < target:
+            await asyncio.sleep(0)
+        dispatch_error = time.monotonic() - target
+        results = await asyncio.gather(
+            *(self.app.invoke(request) for _, request in requests),
+            return_exceptions=True,
+        )
+        for (chat, _), result in zip(requests, results, strict=True):
+            if isinstance(result, Exception):
+                self.log(f"精确发送失败: {result}\nchat: \n{chat}", level="ERROR")
+                continue
+            self.context.prefired.add(id(chat))
+            self._checkpoint(chat, 1)
+            message_id, date = self._sent_message_info(result)
+            server_error = (
+                f"{date - fire_at.timestamp():+.0f}秒" if date is not None else "未知"
+            )
+            self.log(
+                f"精确发送完成: chat {chat.chat_id}, 本地发送误差{dispatch_error * 1000:+.1f}毫秒, "
+                f"服务器记录时间误差{server_error}（精度1秒）"
+            )
+            if message_id is not None and chat.delete_after is not None:
+                self.message_deleter.schedule(
+                    chat.chat_id, message_id, chat.delete_after
+                )
 
     async def run_once(self, num_of_dialogs):
         return await self.run(num_of_dialogs, only_once=True, force_rerun=True)
@@ -859,10 +1872,10 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
     async def send_text(
         self, chat_id: int, text: str, delete_after: int = None, **kwargs
     ):
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(chat_ids=[chat_id], print_chat=False)
         async with self.app:
             await self.send_message(chat_id, text, delete_after, **kwargs)
+            await self.message_deleter.drain()
 
     async def send_dice_cli(
         self,
@@ -871,17 +1884,31 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
         delete_after: int = None,
         **kwargs,
     ):
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(chat_ids=[chat_id], print_chat=False)
         async with self.app:
             await self.send_dice(chat_id, emoji, delete_after, **kwargs)
+            await self.message_deleter.drain()
 
     async def _on_message(self, client: Client, message: Message):
         chats = self.context.sign_chats.get(message.chat.id)
         if not chats:
             self.log("忽略意料之外的聊天", level="WARNING")
             return
-        self.context.chat_messages[message.chat.id][message.id] = message
+        sent_at = message.edit_date or message.date
+        if (
+            isinstance(sent_at, datetime)
+            and sent_at.timestamp()
+            < self.app.server_time(self.context.started_at) - STALE_UPDATE_GRACE
+        ):
+            self.log(f"忽略本轮签到开始前的消息: {message.id}, 发送时间{sent_at}")
+            return
+        # 只保留签到需要的内容，且每个Chat最多保留固定数量
+        record = MessageRecord.from_message(message)
+        self.context.chat_messages[message.chat.id].put(record, time.monotonic())
+        if action := self.context.pending_actions.get(message.chat.id):
+            self._start_prefetch(action, record)
+        # 唤醒正在等待该聊天消息的动作
+        self.context.chat_events[message.chat.id].set()
 
     async def on_message(self, client: Client, message: Message):
         self.log(
@@ -895,96 +1922,158 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
         )
         # 避免更新正在处理的消息，等待处理完成
         while (
-            self.context.waiting_message
-            and self.context.waiting_message.id == message.id
-        ):
+            waiting := self.context.waiting_messages.get(message.chat.id)
+        ) and waiting.id == message.id:
             await asyncio.sleep(0.3)
         await self._on_message(client, message)
 
     async def _click_keyboard_by_text(
-        self, action: ClickKeyboardByTextAction, message: Message
+        self, action: ClickKeyboardByTextAction, message: MessageRecord
     ):
-        if reply_markup := message.reply_markup:
-            if isinstance(reply_markup, InlineKeyboardMarkup):
-                flat_buttons = (b for row in reply_markup.inline_keyboard for b in row)
-                option_to_btn: dict[str, InlineKeyboardButton] = {}
-                for btn in flat_buttons:
-                    option_to_btn[btn.text] = btn
-                    if action.text in btn.text:
-                        self.log(f"点击按钮: {btn.text}")
-                        await self.request_callback_answer(
-                            self.app,
-                            message.chat.id,
-                            message.id,
-                            btn.callback_data,
-                        )
-                        return True
+        for text, callback_data in message.flat_buttons():
+            if action.text in text:
+                self.log(f"点击按钮: {text}")
+                await self.request_callback_answer(
+                    self.app,
+                    message.chat_id,
+                    message.id,
+                    callback_data,
+                )
+                return True
         return False
 
+    def _start_prefetch(self, action: ActionT, message: MessageRecord):
+        """
+        待执行的动作需要下载图片或调用大模型时，收到Bot的消息后立即在后台开始，
+        动作处理时直接等待结果。每个Chat同时至多一个：已有进行中或已成功的结果时不再开始，
+        只有同一消息被编辑后才重新开始。
+        """
+        if not message.from_bot:
+            return
+        old = self.context.prefetches.get(message.chat_id)
+        if old is not None and old[0].id != message.id:
+            task = old[1]
+            if not task.done() or (not task.cancelled() and task.exception() is None):
+                return
+        if isinstance(action, ChooseOptionByImageAction):
+            if not self._has_image_options(message):
+                return
+            coro = self._solve_image_options(message)
+        elif isinstance(action, ReplyByCalculationProblemAction):
+            if not message.text:
+                return
+            coro = self._solve_calculation_problem(message)
+        else:
+            return
+        # 消息被编辑后，之前的结果已失效
+        if old is not None:
+            old[1].cancel()
+        task = asyncio.create_task(coro)
+        task.add_done_callback(_ignore_task_exception)
+        self.context.prefetches[message.chat_id] = (message, task)
+
+    async def _prefetched(self, message: MessageRecord, solve: Callable[[], Awaitable]):
+        """取出该消息提前开始的结果，没有时现在开始"""
+        entry = self.context.prefetches.pop(message.chat_id, None)
+        if entry is not None:
+            prefetched_message, task = entry
+            if prefetched_message is message:
+                return await task
+            task.cancel()
+        return await solve()
+
+    def _cancel_prefetches(self, chat_id: int):
+        if entry := self.context.prefetches.pop(chat_id, None):
+            entry[1].cancel()
+
+    async def _solve_calculation_problem(self, message: MessageRecord) -> str:
+        self.log("检测到文本回复，尝试调用大模型进行计算题回答")
+        self.log(f"问题: \n{message.text}")
+        return await self.get_ai_tools().calculate_problem(message.text)
+
     async def _reply_by_calculation_problem(
-        self, action: ReplyByCalculationProblemAction, message
+        self, action: ReplyByCalculationProblemAction, message: MessageRecord
     ):
         if message.text:
-            self.log("检测到文本回复，尝试调用大模型进行计算题回答")
-            self.log(f"问题: \n{message.text}")
-            answer = await self.get_ai_tools().calculate_problem(message.text)
+            answer = await self._prefetched(
+                message, lambda: self._solve_calculation_problem(message)
+            )
             self.log(f"回答为: {answer}")
-            await self.send_message(message.chat.id, answer)
+            await self.send_message(message.chat_id, answer)
             return True
         return False
 
-    async def _choose_option_by_image(self, action: ChooseOptionByImageAction, message):
-        if reply_markup := message.reply_markup:
-            if isinstance(reply_markup, InlineKeyboardMarkup) and message.photo:
-                flat_buttons = (b for row in reply_markup.inline_keyboard for b in row)
-                option_to_btn = {btn.text: btn for btn in flat_buttons if btn.text}
-                self.log("检测到图片，尝试调用大模型进行图片识别并选择选项")
-                image_buffer: BinaryIO = await self.app.download_media(
-                    message.photo.file_id, in_memory=True
-                )
-                image_buffer.seek(0)
-                image_bytes = image_buffer.read()
-                options = list(option_to_btn)
-                result_index = await self.get_ai_tools().choose_option_by_image(
-                    image_bytes,
-                    "选择正确的选项",
-                    list(enumerate(options)),
-                )
-                result = options[result_index]
-                self.log(f"选择结果为: {result}")
-                target_btn = option_to_btn.get(result.strip())
-                if not target_btn:
-                    self.log("未找到匹配的按钮", level="WARNING")
-                    return False
-                await self.request_callback_answer(
-                    self.app,
-                    message.chat.id,
-                    message.id,
-                    target_btn.callback_data,
-                )
-                return True
+    @staticmethod
+    def _has_image_options(message: MessageRecord) -> bool:
+        return bool(message.buttons and message.photo)
+
+    @staticmethod
+    def _image_options(message: MessageRecord) -> dict[str, Union[str, bytes]]:
+        """选项文本 -> callback_data"""
+        return {text: data for text, data in message.flat_buttons() if text}
+
+    async def _solve_image_options(self, message: MessageRecord) -> int:
+        """下载图片并调用大模型，返回选项的序号"""
+        self.log("检测到图片，尝试调用大模型进行图片识别并选择选项")
+        image_buffer: BinaryIO = await self.app.download_media(
+            message.photo, in_memory=True
+        )
+        image_buffer.seek(0)
+        image_bytes = image_buffer.read()
+        options = list(self._image_options(message))
+        return await self.get_ai_tools().choose_option_by_image(
+            image_bytes,
+            "选择正确的选项",
+            list(enumerate(options)),
+        )
+
+    async def _choose_option_by_image(
+        self, action: ChooseOptionByImageAction, message: MessageRecord
+    ):
+        if self._has_image_options(message):
+            option_to_data = self._image_options(message)
+            options = list(option_to_data)
+            result_index = await self._prefetched(
+                message, lambda: self._solve_image_options(message)
+            )
+            result = options[result_index]
+            self.log(f"选择结果为: {result}")
+            if result.strip() not in option_to_data:
+                self.log("未找到匹配的按钮", level="WARNING")
+                return False
+            await self.request_callback_answer(
+                self.app,
+                message.chat_id,
+                message.id,
+                option_to_data[result.strip()],
+            )
+            return True
         return False
 
-    async def wait_for(self, chat: SignChatV3, action: ActionT, timeout=10):
+    async def wait_for(
+        self, chat: SignChatV3, action: ActionT, timeout=DEFAULT_ACTION_TIMEOUT
+    ):
+        """
+        执行动作。发送类动作返回发送的消息；其他动作返回被成功处理的消息的到达时间
+        （``time.monotonic()``），超时返回``None``
+        """
         if isinstance(action, SendTextAction):
             return await self.send_message(chat.chat_id, action.text, chat.delete_after)
         elif isinstance(action, SendDiceAction):
             return await self.send_dice(chat.chat_id, action.dice, chat.delete_after)
         self.context.waiter.add(chat.chat_id)
-        start = time.perf_counter()
-        last_message = None
-        while time.perf_counter() - start < timeout:
-            await asyncio.sleep(0.3)
-            messages_dict = self.context.chat_messages.get(chat.chat_id)
-            if not messages_dict:
-                continue
-            messages = list(messages_dict.values())
-            # 暂无新消息
-            if messages[-1] == last_message:
-                continue
-            last_message = messages[-1]
-            for message in messages:
-                self.context.waiting_message = message
+        ring = self.context.chat_messages[chat.chat_id]
+        event = self.context.chat_events[chat.chat_id]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        cursor = 0  # 只处理游标之后到达（或被编辑）的消息
+        while True:
+            while (update := ring.next_update(cursor)) is not None:
+                cursor, message, arrived_at = update
+                # 已被之前的动作处理，或之后还有该消息更新的版本
+                if not ring.is_latest(message):
+                    continue
+                self.context.waiting_messages[chat.chat_id] = message
                 ok = False
                 if isinstance(action, ClickKeyboardByTextAction):
                     ok = await self._click_keyboard_by_text(action, message)
@@ -993,11 +2082,21 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
                 elif isinstance(action, ChooseOptionByImageAction):
                     ok = await self._choose_option_by_image(action, message)
                 if ok:
-                    self.context.waiter.sub(message.chat.id)
+                    self.context.waiter.sub(chat.chat_id)
                     # 将消息ID对应value置为None，保证收到消息的编辑时消息所处的顺序
-                    self.context.chat_messages[chat.chat_id][message.id] = None
-                    return None
-                self.log(f"忽略消息: {readable_message(message)}")
+                    ring.mark_handled(message.id)
+                    return arrived_at
+                self.log(f"忽略消息: {message.readable()}")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            # 游标已追上，此处到clear之间没有await，不会丢失通知
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        self.context.waiter.sub(chat.chat_id)
         self.log(f"等待超时: \nchat: \n{chat} \naction: {action}", level="WARNING")
         return None
 
@@ -1027,8 +2126,7 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
     ):
         now = get_now()
         it = croniter(crontab, start_time=now)
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(chat_ids=[chat_id], print_chat=False)
         results = []
         async with self.app:
             for n in range(next_times):
@@ -1041,14 +2139,12 @@ class UserSigner(BaseUserWorker[SignConfigV3]):
                     text,
                     schedule_date=next_dt,
                 )
-                await asyncio.sleep(0.1)
                 print_to_user(f"已配置次数：{n + 1}")
         self.log(f"已配置定时发送消息，次数{next_times}")
         return results
 
     async def get_schedule_messages(self, chat_id):
-        if self.user is None:
-            await self.login(print_chat=False)
+        await self.ensure_login(chat_ids=[chat_id], print_chat=False)
         async with self.app:
             messages = await self.app.get_scheduled_messages(chat_id)
             for message in messages:
@@ -1060,6 +2156,10 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
     _tasks_dir = "monitors"
     cfg_cls = MonitorConfig
     config: MonitorConfig
+    dispatcher: ChatDispatcher
+    dedup: Optional[DedupWindow] = None
+    claims: Optional[ClaimStore] = None
+    _failovers: set
 
     def ask_one(self):
         input_ = UserInput()
@@ -1246,40 +2346,192 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
                     )
                 )
 
+    async def resolve_peers(self):
+        """
+        将监控规则中的username（Chat、发送者及转发目标）并发解析为id，之后的消息按id
+        分桶匹配；解析失败的username仍按username比较。
+        """
+        matcher = self.config.matcher
+        usernames = matcher.usernames()
+        if not usernames:
+            return
+        results = await asyncio.gather(
+            *(self.app.get_chat(username) for username in usernames),
+            return_exceptions=True,
+        )
+        # 在已有的解析结果上更新，偶尔解析失败时保留之前的id
+        peers = dict(matcher.peers)
+        for username, result in zip(usernames, results, strict=True):
+            if isinstance(result, Exception):
+                self.log(f"解析username「{username}」失败: {result}", level="WARNING")
+                continue
+            peers[username] = result.id
+        matcher.resolve(peers)
+        self.app.watch_peers(self, [matcher.peer_id(c) for c in self.config.chat_ids])
+        self.log(f"已解析{len(peers)}/{len(usernames)}个username")
+
+    async def _refresh_peers(self):
+        while True:
+            await asyncio.sleep(PEER_REFRESH_INTERVAL)
+            try:
+                await self.resolve_peers()
+            except Exception as e:
+                self.log(f"重新解析username失败: {e}", level="WARNING")
+
+    async def _report_stats(self):
+        """定期输出消息处理统计，统计没有变化时不输出"""
+        last = None
+        while True:
+            await asyncio.sleep(MONITOR_STATS_INTERVAL)
+            stats = self.dispatcher.stats()
+            if stats != last:
+                self.log(f"消息处理统计: {stats}")
+                last = stats
+
+    async def _save_dedup(self):
+        """定期保存去重记录，异常退出时最多丢失``DEDUP_SAVE_INTERVAL``秒内的记录"""
+        while True:
+            await asyncio.sleep(DEDUP_SAVE_INTERVAL)
+            if not self.dedup.dirty:
+                continue
+            try:
+                self.dedup.save()
+            except OSError as e:
+                self.log(f"保存去重记录失败: {e}", level="WARNING")
+
+    def is_duplicate(self, message: Message, rule_index: Optional[int] = None) -> bool:
+        """在去重窗口内出现过相同文本（按``dedup_scope``区分Chat、监控项）"""
+        if self.dedup is None:
+            return False
+        scope = self.config.dedup_scope
+        if scope == "chat":
+            key = self.dedup.make_key(message.text, message.chat.id)
+        elif scope == "rule":
+            key = self.dedup.make_key(message.text, rule_index)
+        else:
+            key = self.dedup.make_key(message.text)
+        return self.dedup.seen(key)
+
     async def on_message(self, client, message: Message):
-        for match_cfg in self.config.match_cfgs:
-            if not match_cfg.match(message):
+        """匹配到的监控项交给``dispatcher``按Chat排队处理，不阻塞后续消息"""
+        indices = self.config.matcher.match_indices(message)
+        if not indices:
+            return
+        if self.config.dedup_scope != "rule" and self.is_duplicate(message):
+            self.log(f"忽略重复消息: chat {message.chat.id}, message {message.id}")
+            return
+        if self.should_claim(message) and not await self._claim(message):
+            self.log(
+                f"消息已由其他账号认领: chat {message.chat.id}, message {message.id}"
+            )
+            task = asyncio.create_task(self._failover(message, indices))
+            self._failovers.add(task)
+            task.add_done_callback(self._failovers.discard)
+            return
+        self._dispatch(message, indices)
+
+    def _dispatch(self, message: Message, indices: List[int]):
+        by_rule = self.config.dedup_scope == "rule"
+        for index in indices:
+            match_cfg = self.config.match_cfgs[index]
+            if by_rule and self.is_duplicate(message, index):
+                self.log(f"忽略重复消息: {match_cfg}")
                 continue
             self.log(f"匹配到监控项：{match_cfg}")
-            await self.forward_to_external(match_cfg, message)
+            self.dispatcher.submit(
+                message.chat.id,
+                functools.partial(self.handle_match, match_cfg, message),
+            )
+        if self.should_claim(message):
+            # 同一Chat的任务按顺序执行，此时之前的监控项均已处理
+            self.dispatcher.submit(
+                message.chat.id,
+                functools.partial(self._complete_claim, message.chat.id, message.id),
+            )
+
+    def should_claim(self, message: Message) -> bool:
+        """
+        只有频道及超级群组的消息id在各账号间一致，私聊（包括Bot）及普通群组的消息id
+        按账号独立编号，无法跨账号认领，由各账号各自处理
+        """
+        return self.claims is not None and message.chat.type in (
+            ChatType.CHANNEL,
+            ChatType.SUPERGROUP,
+        )
+
+    async def _claim(self, message: Message) -> bool:
+        """在线程中认领消息，认领表不可用（如被锁定）时直接处理，宁可重复也不漏处理"""
+        try:
+            return await asyncio.to_thread(
+                self.claims.claim, message.chat.id, message.id
+            )
+        except sqlite3.Error as e:
+            self.log(f"认领消息失败，直接处理: {e}", level="WARNING")
+            return True
+
+    async def _complete_claim(self, chat_id: int, message_id: int):
+        try:
+            await asyncio.to_thread(self.claims.complete, chat_id, message_id)
+        except sqlite3.Error as e:
+            self.log(f"标记消息处理完成失败: {e}", level="WARNING")
+
+    async def _failover(self, message: Message, indices: List[int]):
+        """认领消息的账号在租约时间内未处理完成且已离线时，接管该消息"""
+        await asyncio.sleep(self.claims.lease)
+        try:
+            claimed = await asyncio.to_thread(
+                self.claims.claim, message.chat.id, message.id, recheck=True
+            )
+        except sqlite3.Error as e:
+            # 之前已由其他在线账号认领，无法确认其是否离线时不接管
+            self.log(f"检查消息认领状态失败: {e}", level="WARNING")
+            return
+        if claimed:
+            self.log(
+                f"认领账号已离线，接管消息: chat {message.chat.id}, message {message.id}"
+            )
+            self._dispatch(message, indices)
+
+    async def _heartbeat(self):
+        while True:
             try:
-                send_text = await self.get_send_text(match_cfg, message)
-                if not send_text:
-                    self.log("发送内容为空", level="WARNING")
-                else:
-                    forward_to_chat_id = match_cfg.forward_to_chat_id or message.chat.id
-                    self.log(f"发送文本：{send_text}至{forward_to_chat_id}")
-                    await self.send_message(
-                        forward_to_chat_id,
-                        send_text,
-                        delete_after=match_cfg.delete_after,
-                    )
+                await asyncio.to_thread(self.claims.heartbeat)
+            except sqlite3.Error as e:
+                self.log(f"写入心跳失败: {e}", level="WARNING")
+            await asyncio.sleep(self.claims.lease / 3)
 
-                if match_cfg.push_via_server_chan:
-                    server_chan_send_key = (
-                        match_cfg.server_chan_send_key
-                        or os.environ.get("SERVER_CHAN_SEND_KEY")
+    async def handle_match(self, match_cfg: MatchConfig, message: Message):
+        await self.forward_to_external(match_cfg, message)
+        try:
+            send_text = await self.get_send_text(match_cfg, message)
+            if not send_text:
+                self.log("发送内容为空", level="WARNING")
+            else:
+                forward_to_chat_id = (
+                    self.config.matcher.peer_id(match_cfg.forward_to_chat_id)
+                    or message.chat.id
+                )
+                self.log(f"发送文本：{send_text}至{forward_to_chat_id}")
+                await self.send_message(
+                    forward_to_chat_id,
+                    send_text,
+                    delete_after=match_cfg.delete_after,
+                )
+
+            if match_cfg.push_via_server_chan:
+                server_chan_send_key = match_cfg.server_chan_send_key or os.environ.get(
+                    "SERVER_CHAN_SEND_KEY"
+                )
+                if not server_chan_send_key:
+                    self.log("未配置Server酱的SendKey", level="WARNING")
+                else:
+                    await sc_send(
+                        server_chan_send_key,
+                        f"匹配到监控项：{match_cfg.chat_id}",
+                        f"消息内容为:\n\n{message.text}",
                     )
-                    if not server_chan_send_key:
-                        self.log("未配置Server酱的SendKey", level="WARNING")
-                    else:
-                        await sc_send(
-                            server_chan_send_key,
-                            f"匹配到监控项：{match_cfg.chat_id}",
-                            f"消息内容为:\n\n{message.text}",
-                        )
-            except IndexError as e:
-                logger.exception(e)
+        except IndexError as e:
+            logger.exception(e)
 
     async def get_send_text(self, match_cfg: MatchConfig, message: Message) -> str:
         send_text = match_cfg.get_send_text(message.text)
@@ -1291,19 +2543,64 @@ class UserMonitor(BaseUserWorker[MonitorConfig]):
         return send_text
 
     async def run(self, num_of_dialogs=20):
-        if self.user is None:
-            await self.login(num_of_dialogs, print_chat=True)
-
         cfg = self.load_config(self.cfg_cls)
+        await self.ensure_login(num_of_dialogs, chat_ids=cfg.chat_ids)
         if cfg.requires_ai:
             self.ensure_ai_cfg()
+        matcher = cfg.matcher  # 启动前编译好所有监控项
+        self.log(f"已编译{len(matcher.match_cfgs)}个监控项")
+        self.dispatcher = ChatDispatcher(cfg.max_workers, cfg.max_queue_size)
+        self.claims = None
+        if cfg.coordinate_accounts:
+            self.claims = ClaimStore(
+                self.workdir / "claims.sqlite3",
+                owner=self._account,
+                task=self.task_name,
+                lease=cfg.claim_lease,
+            )
+        self._failovers = set()
+        self.dedup = None
+        if cfg.dedup_window > 0:
+            self.dedup = DedupWindow(
+                cfg.dedup_window,
+                file=self.task_dir / "dedup.json" if cfg.dedup_persist else None,
+            )
 
-        self.app.add_handler(
-            MessageHandler(self.on_message, filters.text & filters.chat(cfg.chat_ids)),
+        handler = MessageHandler(
+            self.on_message, filters.text & filters.chat(cfg.chat_ids)
         )
-        async with self.app:
-            self.log("开始监控...")
-            await idle()
+        self.app.add_handler(handler)
+        self.app.watch_peers(self, cfg.chat_ids)
+        try:
+            async with self.app:
+                self.message_deleter.start()
+                await self.resolve_peers()
+                tasks = [
+                    asyncio.create_task(self._refresh_peers()),
+                    asyncio.create_task(self._report_stats()),
+                ]
+                if self.claims is not None:
+                    tasks.append(asyncio.create_task(self._heartbeat()))
+                if self.dedup is not None and self.dedup.file:
+                    tasks.append(asyncio.create_task(self._save_dedup()))
+                self.dispatcher.start()
+                self.log("开始监控...")
+                try:
+                    await idle()
+                finally:
+                    for task in [*tasks, *self._failovers]:
+                        task.cancel()
+                    await self.dispatcher.stop()
+                    self.log(f"消息处理统计: {self.dispatcher.stats()}")
+                    if self.claims is not None:
+                        self.log(f"认领统计: {self.claims.stats()}")
+                        self.claims.close()
+                    if self.dedup is not None:
+                        self.dedup.save()
+                        self.log(f"已忽略{self.dedup.suppressed}条重复消息")
+        finally:
+            self.app.remove_handler(handler)
+            self.app.unwatch_peers(self)
 
 
 class _UDPProtocol(asyncio.DatagramProtocol):
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import pathlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Union
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """忽略大小写及空白差异"""
+    return _WHITESPACE.sub(" ", text or "").strip().lower()
+
+
+class DedupWindow:
+    """
+    重复消息抑制窗口：记录最近出现过的消息文本的哈希，``window``秒内再次出现时视为重复。
+
+    按首次出现时间过期，最多保留``max_size``条（超出时淘汰最早的），可选保存到文件，
+    重启后继续生效。
+    """
+
+    def __init__(
+        self,
+        window: float,
+        max_size: int = 10000,
+        file: Optional[Union[str, pathlib.Path]] = None,
+    ):
+        self.window = window
+        self.max_size = max_size
+        self.file = pathlib.Path(file) if file else None
+        self._seen: "OrderedDict[str, float]" = OrderedDict()  # key -> 首次出现时间
+        self.suppressed = 0
+        self.dirty = False  # 有尚未保存的记录
+        self.load()
+
+    @staticmethod
+    def make_key(text: Optional[str], *scope) -> str:
+        """``scope``为参与去重的其他部分，如chat id、规则序号"""
+        data = "\x00".join([normalize_text(text), *map(str, scope)])
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _expire(self, now: float):
+        while self._seen:
+            key, first_seen = next(iter(self._seen.items()))
+            if now - first_seen < self.window and len(self._seen) <= self.max_size:
+                break
+            self._seen.popitem(last=False)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        """``key``在窗口内出现过时返回True，否则记录并返回False"""
+        now = time.time() if now is None else now
+        self._expire(now)
+        if key in self._seen:
+            self.suppressed += 1
+            return True
+        self._seen[key] = now
+        self.dirty = True
+        self._expire(now)
+        return False
+
+    def load(self):
+        if not (self.file and self.file.is_file()):
+            return
+        try:
+            with open(self.file, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        for key, first_seen in sorted(data.items(), key=lambda item: item[1]):
+            self._seen[key] = float(first_seen)
+        self._expire(time.time())
+
+    def save(self):
+        if not self.file:
+            return
+        self.dirty = False
+        self._expire(time.time())
+        tmp = self.file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(dict(self._seen), fp)
+        os.replace(tmp, self.file)
+
+    def __len__(self):
+        return len(self._seen)
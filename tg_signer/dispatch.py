@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger("tg-signer")
+
+JobFactory = Callable[[], Awaitable]
+
+
+class ChatDispatcher:
+    """
+    按Chat排队的并发处理池：每个Chat一个FIFO队列，由最多``workers``个协程处理。
+    同一Chat的任务按提交顺序依次执行，不同Chat之间并行，单个慢任务（如AI回复）
+    只会阻塞其所在的Chat。
+
+    每个Chat最多排队``max_queue``个任务，超出时丢弃最早的任务，保证处理的是最新的消息。
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 100):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._queues: Dict[Hashable, Deque[JobFactory]] = {}
+        # 有待处理任务且未被处理中的Chat，每个Chat至多出现一次
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Set[Hashable] = set()  # 正在处理中的Chat
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        for key, queue in self._queues.items():
+            if queue:
+                self._ready.put_nowait(key)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def submit(self, key: Hashable, factory: JobFactory):
+        """将``factory()``加入``key``对应的队列"""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+            logger.warning(f"Chat {key}的待处理任务过多，丢弃最早的任务")
+        queue.append(factory)
+        if len(queue) == 1 and key not in self._running and self._ready is not None:
+            self._ready.put_nowait(key)
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues.get(key)
+            if not queue:
+                continue
+            factory = queue.popleft()
+            self._running.add(key)
+            self.active += 1
+            try:
+                await factory()
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.exception(e)
+            finally:
+                self.active -= 1
+                self._running.discard(key)
+                if queue:
+                    # 排到其他Chat之后，避免单个Chat长期占用worker
+                    self._ready.put_nowait(key)
+                else:
+                    self._queues.pop(key, None)
+
+    @property
+    def queue_depths(self) -> Dict[str, int]:
+        return {str(k): len(q) for k, q in self._queues.items() if q}
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "queue_depths": self.queue_depths,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,95 @@
+import json
+import pathlib
+from datetime import datetime
+from typing import Dict, List, Optional, TextIO, Union
+
+
+class SignJournal:
+    """
+    签到进度日志（追加写入的JSON Lines）。
+
+    第一行记录本轮签到的开始时间，之后每完成一个动作追加一行``{"chat": key, "done": n}``，
+    ``key``由签到配置的序号和chat_id组成。进程中断后重新运行同一轮签到时，
+    据此跳过已完成的Chat和动作；本轮签到完成并写入签到记录后删除。
+    """
+
+    def __init__(self, file: Union[str, pathlib.Path]):
+        self.file = pathlib.Path(file)
+        self.started_at: Optional[datetime] = None
+        self.progress: Dict[str, int] = {}  # key -> 已完成的动作数
+        self._keys: Dict[int, str] = {}  # id(SignChatV3) -> key
+        self._fp: Optional[TextIO] = None
+
+    @staticmethod
+    def make_key(index: int, chat) -> str:
+        return f"{index}:{chat.chat_id}"
+
+    def load(self) -> Optional[datetime]:
+        """读取上次未完成的进度，返回其开始时间，没有时返回None"""
+        self.started_at = None
+        self.progress = {}
+        if not self.file.is_file():
+            return None
+        with open(self.file, "r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 中断时可能只写入了半行
+                    continue
+                if "begin" in entry:
+                    self.started_at = datetime.fromisoformat(entry["begin"])
+                    self.progress = {}
+                elif "chat" in entry:
+                    key = entry["chat"]
+                    self.progress[key] = max(self.progress.get(key, 0), entry["done"])
+        return self.started_at
+
+    def begin(self, started_at: datetime, chats: List, resume: bool = False):
+        """
+        开始记录一轮签到。``resume``为True时保留``load``读取到的进度继续追加，
+        否则丢弃旧进度重新开始。
+        """
+        self.close()
+        self._keys = {id(chat): self.make_key(i, chat) for i, chat in enumerate(chats)}
+        if resume and self.started_at is not None:
+            self._fp = open(self.file, "a", encoding="utf-8")
+            if not self.file.read_bytes().endswith(b"\n"):
+                # 中断时写入的半行单独占一行，不影响之后的记录
+                self._fp.write("\n")
+            return
+        self.started_at = started_at
+        self.progress = {}
+        self._fp = open(self.file, "w", encoding="utf-8")
+        self._write({"begin": started_at.isoformat()})
+
+    def done_actions(self, chat) -> int:
+        key = self._keys.get(id(chat))
+        return self.progress.get(key, 0) if key is not None else 0
+
+    def record(self, chat, done: int):
+        """记录``chat``已完成前``done``个动作"""
+        key = self._keys.get(id(chat))
+        if key is None or done <= self.progress.get(key, 0):
+            return
+        self.progress[key] = done
+        self._write({"chat": key, "done": done})
+
+    def _write(self, entry: dict):
+        if self._fp is None:
+            return
+        self._fp.write(json.dumps(entry) + "\n")
+        # 只需保证进程中断时已写入的记录不丢失，不做fsync
+        self._fp.flush()
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def finish(self):
+        """本轮签到已完成，删除进度日志"""
+        self.close()
+        self.progress = {}
+        self.started_at = None
+        self.file.unlink(missing_ok=True)
@@ -0,0 +1,75 @@
+import json
+import math
+import os
+import pathlib
+from collections import deque
+from typing import Deque, Dict, Optional, Union
+
+
+class LatencyStats:
+    """
+    记录各Chat、各动作的Bot响应耗时，并据此给出等待超时时间。
+
+    超时时间取最近样本的高百分位数乘以余量系数，并限制在``[floor, ceiling]``之间；
+    样本不足时使用默认值。超时也会作为一个样本记录，使响应慢的Bot的超时时间逐步放宽。
+    """
+
+    max_samples = 50  # 每个key保留的最近样本数
+    min_samples = 5  # 样本数达到该值后才启用自适应超时
+    percentile = 95
+    margin = 2.0  # 超时时间 = 百分位数 * margin
+    floor = 3.0
+    ceiling = 60.0
+
+    def __init__(self, file: Optional[Union[str, pathlib.Path]] = None):
+        self.file = pathlib.Path(file) if file else None
+        self.samples: Dict[str, Deque[float]] = {}
+        self.load()
+
+    @staticmethod
+    def make_key(chat_id: int, index: int, action) -> str:
+        return f"{chat_id}:{index}:{int(action.action)}"
+
+    def load(self):
+        if not (self.file and self.file.is_file()):
+            return
+        try:
+            with open(self.file, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        for key, values in data.items():
+            self.samples[key] = deque(
+                (float(v) for v in values), maxlen=self.max_samples
+            )
+
+    def save(self):
+        if not self.file:
+            return
+        tmp = self.file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(
+                {k: [round(v, 3) for v in vs] for k, vs in self.samples.items()}, fp
+            )
+        os.replace(tmp, self.file)
+
+    def record(self, key: str, seconds: float):
+        samples = self.samples.get(key)
+        if samples is None:
+            samples = self.samples[key] = deque(maxlen=self.max_samples)
+        samples.append(max(0.0, seconds))
+
+    def quantile(self, key: str, percentile: Optional[float] = None) -> Optional[float]:
+        samples = self.samples.get(key)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = math.ceil((percentile or self.percentile) / 100 * len(ordered))
+        return ordered[max(0, rank - 1)]
+
+    def timeout(self, key: str, default: float) -> float:
+        samples = self.samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return default
+        value = self.quantile(key) * self.margin
+        return min(self.ceiling, max(self.floor, value))
@@ -0,0 +1,236 @@
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from pyrogram.types import Message
+
+    from .config import MatchConfig
+
+
+class AhoCorasick:
+    """多模式子串匹配自动机，一次扫描文本即可找出所有出现的模式"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]  # 各状态匹配到的模式序号（含后缀链接）
+        self.size = 0
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (self.size,)
+        self.size += 1
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> Set[int]:
+        """返回在``text``中出现过的模式序号"""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+def normalize_username(username: str) -> str:
+    return username.lower().strip("@")
+
+
+def _is_username(value) -> bool:
+    return isinstance(value, str) and value not in ("me", "self")
+
+
+class _TextIndex:
+    """
+    一组规则的文本索引：exact规则放入哈希表，contains规则合并为一个Aho-Corasick自动机，
+    regex规则预先编译，扫描一遍文本即可得到所有文本匹配的规则
+    """
+
+    def __init__(self, match_cfgs: Sequence["MatchConfig"], indices: Iterable[int]):
+        self._always: List[int] = []  # all规则及值为空的contains规则
+        self._exact: Dict[str, List[int]] = {}
+        self._exact_ignore_case: Dict[str, List[int]] = {}
+        self._regexes = []  # (序号, 编译后的正则)
+        contains: List[Tuple[str, int]] = []
+        contains_ignore_case: List[Tuple[str, int]] = []
+        for index in indices:
+            cfg = match_cfgs[index]
+            value = cfg.rule_value
+            if cfg.rule == "all" or (cfg.rule == "contains" and value == ""):
+                self._always.append(index)
+            elif value is None:
+                continue
+            elif cfg.rule == "exact":
+                if cfg.ignore_case:
+                    self._exact_ignore_case.setdefault(value.lower(), []).append(index)
+                else:
+                    self._exact.setdefault(value, []).append(index)
+            elif cfg.rule == "contains":
+                if cfg.ignore_case:
+                    contains_ignore_case.append((value.lower(), index))
+                else:
+                    contains.append((value, index))
+            elif cfg.rule == "regex":
+                self._regexes.append((index, cfg.rule_pattern))
+        self._contains = AhoCorasick(v for v, _ in contains)
+        self._contains_rules = [i for _, i in contains]
+        self._contains_ignore_case = AhoCorasick(v for v, _ in contains_ignore_case)
+        self._contains_ignore_case_rules = [i for _, i in contains_ignore_case]
+
+    def match_text(self, text: str) -> Set[int]:
+        matched = set(self._always)
+        lowered = text.lower()
+        matched.update(self._exact.get(text, ()))
+        matched.update(self._exact_ignore_case.get(lowered, ()))
+        if self._contains.size:
+            matched.update(self._contains_rules[i] for i in self._contains.search(text))
+        if self._contains_ignore_case.size:
+            matched.update(
+                self._contains_ignore_case_rules[i]
+                for i in self._contains_ignore_case.search(lowered)
+            )
+        for index, pattern in self._regexes:
+            if pattern.search(text):
+                matched.add(index)
+        return matched
+
+
+class RuleMatcher:
+    """
+    由多个``MatchConfig``编译而成的匹配器。规则按Chat分桶，每条消息只对所在Chat的
+    规则扫描一遍文本，再对文本匹配的规则校验发送者。
+
+    ``peers``为已解析的username到id的映射(username已规范化)，解析后的规则按id分桶、
+    按id校验发送者；未能解析的username仍按username比较。
+    """
+
+    def __init__(
+        self,
+        match_cfgs: Sequence["MatchConfig"],
+        peers: Optional[Dict[str, int]] = None,
+    ):
+        self.match_cfgs = list(match_cfgs)
+        self.resolve(peers or {})
+
+    def resolve(self, peers: Dict[str, int]):
+        """按username到id的映射重建索引"""
+        self.peers = dict(peers)
+        buckets: Dict[Union[int, str], List[int]] = {}
+        self._user_ids: List[Optional[frozenset]] = []
+        for index, cfg in enumerate(self.match_cfgs):
+            buckets.setdefault(self._chat_key(cfg.chat_id), []).append(index)
+            self._user_ids.append(self._resolve_users(cfg))
+        self._buckets = {
+            key: _TextIndex(self.match_cfgs, indices)
+            for key, indices in buckets.items()
+        }
+        self._by_username = any(isinstance(key, str) for key in self._buckets)
+
+    def usernames(self) -> List[str]:
+        """规则中出现的所有username(已规范化)，包括Chat、发送者及转发目标"""
+        names = set()
+        for cfg in self.match_cfgs:
+            values = [cfg.chat_id, cfg.forward_to_chat_id, *(cfg.from_user_ids or ())]
+            names.update(normalize_username(v) for v in values if _is_username(v))
+        return sorted(names)
+
+    def peer_id(self, value: Union[int, str, None]) -> Union[int, str, None]:
+        """username已解析时返回其id，否则原样返回"""
+        if _is_username(value):
+            return self.peers.get(normalize_username(value), value)
+        return value
+
+    def _chat_key(self, chat_id: Union[int, str, None]) -> Union[int, str, None]:
+        chat_id = self.peer_id(chat_id)
+        if isinstance(chat_id, str):
+            return normalize_username(chat_id)
+        return chat_id
+
+    def _resolve_users(self, cfg: "MatchConfig") -> Optional[frozenset]:
+        """发送者限制全部可以按id比较时返回id集合（可含"me"），否则返回None"""
+        if not cfg.from_user_ids:
+            return None
+        ids = set()
+        for user in cfg.from_user_set:
+            if isinstance(user, str) and user != "me":
+                if user not in self.peers:
+                    return None
+                user = self.peers[user]
+            ids.add(user)
+        return frozenset(ids)
+
+    def _match_user(self, index: int, message: "Message") -> bool:
+        cfg = self.match_cfgs[index]
+        ids = self._user_ids[index]
+        if ids is None:
+            return cfg.match_user(message)
+        user = message.from_user
+        if not user:
+            return True
+        if cfg.always_ignore_me and user.is_self:
+            return False
+        return user.id in ids or ("me" in ids and user.is_self)
+
+    def match_text(self, text: str, chat_keys: Optional[Iterable] = None) -> List[int]:
+        """返回文本匹配的规则序号，按配置顺序排列；``chat_keys``为None时检查所有Chat"""
+        if chat_keys is None:
+            indexes = self._buckets.values()
+        else:
+            indexes = [self._buckets[k] for k in chat_keys if k in self._buckets]
+        matched = set()
+        for index in indexes:
+            matched |= index.match_text(text)
+        return sorted(matched)
+
+    def match_indices(self, message: "Message") -> List[int]:
+        """返回与消息匹配的所有规则序号，按配置顺序排列"""
+        chat_keys = [message.chat.id]
+        if self._by_username and message.chat.username:
+            chat_keys.append(normalize_username(message.chat.username))
+        return [
+            index
+            for index in self.match_text(message.text, chat_keys)
+            if self._match_user(index, message)
+        ]
+
+    def match(self, message: "Message") -> List["MatchConfig"]:
+        """返回与消息匹配的所有规则，按配置顺序排列"""
+        return [self.match_cfgs[index] for index in self.match_indices(message)]
@@ -0,0 +1,119 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple, Union
+
+from pyrogram.types import InlineKeyboardMarkup, Message
+
+ButtonT = Tuple[str, Union[str, bytes, None]]  # (按钮文本, callback_data)
+
+
+class MessageRecord:
+    """签到过程中需要的消息内容：id、文本、内联键盘按钮、图片引用及是否由Bot发送"""
+
+    __slots__ = ("id", "chat_id", "text", "buttons", "photo", "from_bot")
+
+    def __init__(
+        self,
+        id: int,
+        chat_id: int,
+        text: Optional[str] = None,
+        buttons: Tuple[Tuple[ButtonT, ...], ...] = (),
+        photo: Optional[str] = None,
+        from_bot: bool = False,
+    ):
+        self.id = id
+        self.chat_id = chat_id
+        self.text = text
+        self.buttons = buttons  # 按行保存的内联键盘按钮
+        self.photo = photo  # 图片的file_id
+        self.from_bot = from_bot
+
+    @classmethod
+    def from_message(cls, message: Message) -> "MessageRecord":
+        buttons = ()
+        if isinstance(message.reply_markup, InlineKeyboardMarkup):
+            buttons = tuple(
+                tuple((b.text, b.callback_data) for b in row)
+                for row in message.reply_markup.inline_keyboard
+            )
+        photo = message.photo.file_id if message.photo else None
+        from_bot = bool(message.from_user and message.from_user.is_bot)
+        return cls(message.id, message.chat.id, message.text, buttons, photo, from_bot)
+
+    def flat_buttons(self):
+        return (b for row in self.buttons for b in row)
+
+    def readable(self) -> str:
+        s = "\nMessage: "
+        s += f"\n  text: {self.text or ''}"
+        if self.photo:
+            s += "\n  图片"
+        if self.buttons:
+            s += "\n  InlineKeyboard: "
+            for row in self.buttons:
+                s += "\n   "
+                for text, _ in row:
+                    s += f"{text} | "
+        return s
+
+    def __repr__(self):
+        return f"MessageRecord(id={self.id}, chat_id={self.chat_id})"
+
+
+class MessageRing:
+    """
+    单个Chat的消息环形缓存，最多保留``maxlen``条消息及``maxlen``次到达（含编辑）记录，
+    超出时丢弃最早的，保证内存占用不随Chat消息量增长。
+
+    每次到达分配一个递增序号，等待方通过序号游标读取之后到达的消息；
+    同一消息被编辑后，之前的到达记录不再是该消息的最新版本。
+    """
+
+    __slots__ = ("maxlen", "_index", "_order", "_updates", "seq")
+
+    def __init__(self, maxlen: int = 100):
+        self.maxlen = maxlen
+        self._index: Dict[int, Optional[MessageRecord]] = {}
+        self._order: Deque[int] = deque()  # 消息id，按首次到达顺序
+        self._updates: Deque[Tuple[int, MessageRecord, float]] = deque(maxlen=maxlen)
+        self.seq = 0
+
+    def put(self, record: MessageRecord, arrived_at: float):
+        if record.id not in self._index:
+            self._order.append(record.id)
+            if len(self._order) > self.maxlen:
+                self._index.pop(self._order.popleft(), None)
+        self._index[record.id] = record
+        self.seq += 1
+        self._updates.append((self.seq, record, arrived_at))
+
+    def get(self, message_id: int) -> Optional[MessageRecord]:
+        return self._index.get(message_id)
+
+    def __getitem__(self, message_id: int) -> Optional[MessageRecord]:
+        return self._index[message_id]
+
+    def mark_handled(self, message_id: int):
+        """已被动作处理的消息置为None，之后收到的编辑仍保持原来的顺序"""
+        if message_id in self._index:
+            self._index[message_id] = None
+
+    def is_latest(self, record: MessageRecord) -> bool:
+        """是该消息的最新版本且尚未被处理"""
+        return self._index.get(record.id) is record
+
+    def next_update(self, cursor: int) -> Optional[Tuple[int, MessageRecord, float]]:
+        """返回序号大于``cursor``的第一条到达记录(序号, 消息, 到达时间)，已被丢弃的跳过"""
+        if not self._updates:
+            return None
+        offset = max(0, cursor + 1 - self._updates[0][0])
+        if offset >= len(self._updates):
+            return None
+        return self._updates[offset]
+
+    def clear(self):
+        self._index.clear()
+        self._order.clear()
+        self._updates.clear()
+
+    def __len__(self):
+        return len(self._index)
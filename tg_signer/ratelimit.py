@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from pyrogram import errors, raw
+
+logger = logging.getLogger("tg-signer")
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    令牌桶，遇到FloodWait时会暂停一段时间并降低速率，之后随着成功的请求逐渐恢复。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        min_rate: float = 1 / 60,
+        backoff: float = 0.5,
+        recovery: float = 0.05,
+    ):
+        """
+        :param rate: 每秒生成的令牌数
+        :param capacity: 桶容量，即允许的突发请求数
+        :param min_rate: 降速后的最低速率
+        :param backoff: 遇到FloodWait时速率乘以该系数
+        :param recovery: 每次成功请求后，速率向初始速率恢复的比例
+        """
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.recovery = recovery
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """预订一个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = max(0.0, -self.tokens / self.rate, self.blocked_until - now)
+        return wait
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float):
+        now = time.monotonic()
+        self._refill(now)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.rate = max(self.min_rate, self.rate * self.backoff)
+        self.tokens = min(self.tokens, 0)
+
+    def reward(self):
+        if self.rate < self.base_rate:
+            self.rate = min(
+                self.base_rate, self.rate + (self.base_rate - self.rate) * self.recovery
+            )
+
+
+class RateLimiter:
+    """
+    账户级别及Chat级别的请求限速，并在遇到FloodWait后等待并重试。
+    """
+
+    flood_errors = (errors.FloodWait, errors.SlowmodeWait)
+
+    def __init__(
+        self,
+        rate: float = 20,
+        capacity: float = 20,
+        chat_rate: float = 1,
+        chat_capacity: float = 5,
+        max_flood_wait: float = 300,
+        max_retries: int = 3,
+    ):
+        """
+        :param rate: 账户每秒请求数
+        :param capacity: 账户允许的突发请求数
+        :param chat_rate: 单个Chat每秒请求数
+        :param chat_capacity: 单个Chat允许的突发请求数
+        :param max_flood_wait: 秒, FloodWait超过该值时不再等待，直接抛出异常
+        :param max_retries: 遇到FloodWait后的最大重试次数
+        """
+        self.chat_rate = chat_rate
+        self.chat_capacity = chat_capacity
+        self.max_flood_wait = max_flood_wait
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, capacity)
+        self.chat_buckets: Dict[Hashable, TokenBucket] = {}
+        self.flood_waits = 0  # 遇到的FloodWait次数
+        self.flood_wait_seconds = 0.0  # 因FloodWait等待的总秒数
+
+    def chat_bucket(self, peer_key: Hashable) -> TokenBucket:
+        bucket = self.chat_buckets.get(peer_key)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_capacity)
+            self.chat_buckets[peer_key] = bucket
+        return bucket
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        peer_key: Optional[Hashable] = None,
+    ) -> T:
+        chat_bucket = self.chat_bucket(peer_key) if peer_key is not None else None
+        retries = 0
+        while True:
+            await self.bucket.acquire()
+            if chat_bucket is not None:
+                await chat_bucket.acquire()
+            try:
+                result = await func()
+            except self.flood_errors as e:
+                seconds = float(e.value or 0)
+                # 有peer的请求只惩罚对应的Chat，否则惩罚整个账户
+                (chat_bucket or self.bucket).penalize(seconds)
+                self.flood_waits += 1
+                if seconds > self.max_flood_wait or retries >= self.max_retries:
+                    raise
+                retries += 1
+                self.flood_wait_seconds += seconds
+                logger.warning(
+                    f"触发FloodWait，等待{seconds}秒后重试({retries}/{self.max_retries}): {e}"
+                )
+                continue
+            self.bucket.reward()
+            if chat_bucket is not None:
+                chat_bucket.reward()
+            return result
+
+
+def get_peer_key(query) -> Optional[Hashable]:
+    """从raw请求中取出目标peer，用于Chat级别的限速"""
+    peer = getattr(query, "peer", None)
+    if isinstance(peer, (raw.types.InputPeerUser, raw.types.InputPeerUserFromMessage)):
+        return "user", getattr(peer, "user_id", None)
+    if isinstance(peer, raw.types.InputPeerChat):
+        return "chat", peer.chat_id
+    if isinstance(
+        peer, (raw.types.InputPeerChannel, raw.types.InputPeerChannelFromMessage)
+    ):
+        return "channel", peer.channel_id
+    if isinstance(peer, raw.types.InputPeerSelf):
+        return "self", None
+    return None
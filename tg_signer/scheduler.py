@@ -0,0 +1,424 @@
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import pathlib
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from croniter import croniter
+from pyrogram import errors
+
+from tg_signer.config import SignConfigV3
+from tg_signer.core import (
+    _CLIENT_CONNECT_LATENCIES,
+    _CLIENT_CONNECT_PHASES,
+    _CLIENT_INSTANCES,
+    UserSigner,
+    get_now,
+)
+from tg_signer.supervisor import Supervisor, get_supervisor
+
+logger = logging.getLogger("tg-signer")
+
+
+def discover_tasks(signs_dir: pathlib.Path) -> List[Tuple[str, Optional[str]]]:
+    """
+    扫描签到任务目录，返回(任务名, 账号)列表。
+
+    兼容两种目录结构：
+      - ``signs/<task>/config.json``: 账号取配置中的``account_name``，未配置时为``None``
+      - ``signs/<account>/<task>/config.json``: 任务名为``<account>/<task>``
+    """
+    tasks = []
+    if not signs_dir.is_dir():
+        return tasks
+    for d in sorted(signs_dir.iterdir()):
+        if not d.is_dir():
+            continue
+        config_file = d / "config.json"
+        if config_file.is_file():
+            tasks.append((d.name, _read_account_name(config_file)))
+            continue
+        for sub in sorted(d.iterdir()):
+            sub_config_file = sub / "config.json"
+            if sub.is_dir() and sub_config_file.is_file():
+                account = _read_account_name(sub_config_file) or d.name
+                tasks.append((f"{d.name}/{sub.name}", account))
+    return tasks
+
+
+def _read_account_name(config_file: pathlib.Path) -> Optional[str]:
+    try:
+        with open(config_file, "r", encoding="utf-8") as fp:
+            return json.load(fp).get("account_name") or None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def plan_offsets(
+    items: List[dict],
+    window: float,
+    slot_seconds: float = 30,
+    max_per_proxy: int = 0,
+    max_per_target: int = 0,
+) -> Dict[str, float]:
+    """
+    为同一时刻触发的一组任务分配确定的启动偏移（秒）。
+
+    任务按key的哈希排序后在``window``内均匀分布；每个任务视为占用``slot_seconds``秒，
+    若与已安排的任务重叠导致同一代理或同一目标Chat的并发数超过限制，则顺延到冲突任务结束之后。
+
+    :param items: 每项包含``key``、``proxy``和``targets``（目标chat_id列表）
+    :param max_per_proxy: 同一代理的并发上限，``0``表示不限制
+    :param max_per_target: 同一目标Chat的并发上限，``0``表示不限制
+    :return: key -> 偏移秒数
+    """
+    order = sorted(items, key=lambda it: hashlib.sha1(it["key"].encode()).hexdigest())
+    step = window / len(order) if order else 0
+    placed: List[Tuple[float, dict]] = []
+    offsets = {}
+    for i, item in enumerate(order):
+        offset = i * step
+        while True:
+            overlapping = [
+                (o, it) for o, it in placed if abs(o - offset) < slot_seconds
+            ]
+            conflicts = []
+            if max_per_proxy > 0:
+                same_proxy = [p for p in overlapping if p[1]["proxy"] == item["proxy"]]
+                if len(same_proxy) >= max_per_proxy:
+                    conflicts.extend(same_proxy)
+            if max_per_target > 0:
+                for target in item["targets"]:
+                    same_target = [p for p in overlapping if target in p[1]["targets"]]
+                    if len(same_target) >= max_per_target:
+                        conflicts.extend(same_target)
+            if not conflicts:
+                break
+            offset = min(o + slot_seconds for o, _ in conflicts)
+        placed.append((offset, item))
+        offsets[item["key"]] = round(offset, 3)
+    return offsets
+
+
+class SignJob:
+    def __init__(self, signer: UserSigner):
+        self.signer = signer
+        # 只读取本地配置，登录等准备工作在首次执行时进行
+        self.config: SignConfigV3 = signer.load_config()
+        self.prepared = False
+        self.offset: Optional[float] = None  # 由planner分配的启动偏移
+        self.fire_at: Optional[datetime] = None  # 精确时间模式下本轮的签到时间
+        self.runs = 0
+        self.failures = 0
+        self.initial = False  # 首次运行时间尚未错开
+
+    @property
+    def key(self):
+        return f"{self.signer._account}:{self.signer.task_name}"
+
+    @property
+    def cron(self) -> str:
+        return self.signer._validate_sign_at(self.config.sign_at)
+
+    @property
+    def proxy(self) -> str:
+        proxy = self.signer.app.proxy
+        if not proxy:
+            return "direct"
+        return f"{proxy['scheme']}://{proxy['hostname']}:{proxy['port']}"
+
+    @property
+    def targets(self) -> List[int]:
+        return sorted({c.chat_id for c in self.config.chats})
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.key}>"
+
+
+class SignScheduler:
+    """
+    单进程签到调度器。
+
+    所有任务的下次执行时间保存在一个最小堆中，只有一个协程负责等待最早到期的任务，
+    到期后在并发上限内启动该任务的一轮签到，执行完成后重新计算下次执行时间并入堆。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 10,
+        num_of_dialogs: int = 50,
+        status_file: Optional[pathlib.Path] = None,
+        status_interval: float = 60,
+        spread: bool = True,
+        slot_seconds: float = 30,
+        max_per_proxy: int = 0,
+        max_per_target: int = 0,
+        supervisor: Optional[Supervisor] = None,
+    ):
+        """
+        :param spread: 是否使用planner为同时触发的任务分配均匀、确定的启动偏移（替代各自随机延迟）
+        :param slot_seconds: planner估计的单个任务执行时长
+        :param max_per_proxy: 同一代理的并发上限，``0``表示不限制
+        :param max_per_target: 同一目标Chat的并发上限，``0``表示不限制
+        :param supervisor: 按账号的失败退避及熔断，默认使用全局实例
+        """
+        self.max_concurrency = max_concurrency
+        self.num_of_dialogs = num_of_dialogs
+        self.status_file = status_file
+        self.status_interval = status_interval
+        self._heap: List[Tuple[float, int, SignJob]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.spread = spread
+        self.slot_seconds = slot_seconds
+        self.max_per_proxy = max_per_proxy
+        self.max_per_target = max_per_target
+        self._jobs: List[SignJob] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._due = 0  # 已到期但在等待并发名额的任务数
+        self._proxy_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._target_semaphores: Dict[int, asyncio.Semaphore] = {}
+        self.supervisor = supervisor or get_supervisor()
+
+    def add(self, signer: UserSigner, fire_at: Optional[float] = None):
+        """添加任务，配置无法加载时记录错误并跳过该任务，不影响其他任务"""
+        try:
+            job = SignJob(signer)
+        except Exception as e:
+            signer.log(f"加载配置失败，跳过该任务: {e}", level="ERROR")
+            logger.debug(e, exc_info=True)
+            return None
+        self._jobs.append(job)
+        if fire_at is None:
+            job.initial = True
+        self.push(job, fire_at)
+        return job
+
+    def initial_delay(self, job: SignJob) -> float:
+        """启动时首次运行的延迟，与之后每轮相同地错开，避免所有任务同时连接"""
+        if self.spread and job.offset is not None:
+            return job.offset
+        return random.uniform(0, job.config.random_seconds)
+
+    def _stagger_initial(self):
+        now = time.time()
+        heap = []
+        for fire_at, counter, job in self._heap:
+            if job.initial:
+                fire_at = now + self.initial_delay(job)
+                job.initial = False
+            heap.append((fire_at, counter, job))
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def plan(self) -> List[dict]:
+        """
+        按(crontab, random_seconds)分组，为同时触发的任务分配启动偏移，返回计划供查看
+        """
+        groups: Dict[Tuple[str, int], List[SignJob]] = defaultdict(list)
+        for job in self._jobs:
+            groups[(job.cron, int(job.config.random_seconds))].append(job)
+        plan = []
+        for (cron, window), jobs in groups.items():
+            offsets = plan_offsets(
+                [{"key": j.key, "proxy": j.proxy, "targets": j.targets} for j in jobs],
+                window,
+                slot_seconds=self.slot_seconds,
+                max_per_proxy=self.max_per_proxy,
+                max_per_target=self.max_per_target,
+            )
+            next_base = croniter(cron, get_now()).next(datetime)
+            for job in jobs:
+                job.offset = offsets[job.key]
+                plan.append(
+                    {
+                        "job": job.key,
+                        "cron": cron,
+                        "window": window,
+                        "offset": job.offset,
+                        "proxy": job.proxy,
+                        "targets": job.targets,
+                        "next_run": (
+                            next_base + timedelta(seconds=job.offset)
+                        ).isoformat(),
+                    }
+                )
+        plan.sort(key=lambda p: (p["next_run"], p["job"]))
+        return plan
+
+    def next_run(self, job: SignJob, now: datetime) -> datetime:
+        if self.spread and job.offset is not None:
+            base = croniter(job.cron, now).next(datetime)
+            return base + timedelta(seconds=job.offset)
+        return job.signer.get_next_run(job.config, now)
+
+    @contextlib.asynccontextmanager
+    async def _limits(self, job: SignJob):
+        async with contextlib.AsyncExitStack() as stack:
+            if self.max_per_proxy > 0:
+                semaphore = self._proxy_semaphores.setdefault(
+                    job.proxy, asyncio.Semaphore(self.max_per_proxy)
+                )
+                await stack.enter_async_context(semaphore)
+            if self.max_per_target > 0:
+                # 按固定顺序获取，避免相互等待
+                for target in job.targets:
+                    semaphore = self._target_semaphores.setdefault(
+                        target, asyncio.Semaphore(self.max_per_target)
+                    )
+                    await stack.enter_async_context(semaphore)
+            yield
+
+    def push(self, job: SignJob, fire_at: Optional[float] = None):
+        fire_at = time.time() if fire_at is None else fire_at
+        heapq.heappush(self._heap, (fire_at, next(self._counter), job))
+        self._wakeup.set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._heap)
+
+    def stats(self) -> dict:
+        next_fire_at = self._heap[0][0] if self._heap else None
+        return {
+            "at": get_now().isoformat(),
+            "scheduled": self.queue_depth,
+            "due": self._due,
+            "running": len(self._running),
+            "max_concurrency": self.max_concurrency,
+            "next_fire_in": (
+                max(0.0, round(next_fire_at - time.time(), 3))
+                if next_fire_at is not None
+                else None
+            ),
+            "connect_latencies": {
+                key: round(latency, 3)
+                for key, latency in _CLIENT_CONNECT_LATENCIES.items()
+            },
+            "connect_phases": {
+                key: {phase: round(v, 3) for phase, v in phases.items()}
+                for key, phases in _CLIENT_CONNECT_PHASES.items()
+            },
+            "accounts": self.supervisor.health(),
+            "handlers": {
+                key: client.handler_count for key, client in _CLIENT_INSTANCES.items()
+            },
+            "stale_updates": {
+                key: client.stale_updates for key, client in _CLIENT_INSTANCES.items()
+            },
+            "filtered_updates": {
+                key: client.filtered_updates
+                for key, client in _CLIENT_INSTANCES.items()
+            },
+            "next_jobs": [
+                {"job": job.key, "fire_at": fire_at}
+                for fire_at, _, job in heapq.nsmallest(10, self._heap)
+            ],
+        }
+
+    def report_status(self):
+        stats = self.stats()
+        logger.info(
+            f"调度器状态: 待执行{stats['scheduled']}, 等待名额{stats['due']}, "
+            f"执行中{stats['running']}, 最近任务{stats['next_fire_in']}秒后触发"
+        )
+        if self.status_file:
+            tmp = self.status_file.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as fp:
+                json.dump(stats, fp, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.status_file)
+
+    async def _status_loop(self):
+        while True:
+            self.report_status()
+            await asyncio.sleep(self.status_interval)
+
+    async def _run_job(self, job: SignJob):
+        signer = job.signer
+        account = signer._account
+        breaker = self.supervisor.breaker(account)
+        if not breaker.allow():
+            # 账号已熔断或正在试探，推迟到冷却结束，试探中时按间隔再检查
+            self._running.pop(job.key, None)
+            delay = max(breaker.retry_in(), self.supervisor.probe_poll_interval)
+            self.push(job, time.time() + delay)
+            return
+        self._due += 1
+        try:
+            async with self._semaphore, self._limits(job):
+                self._due -= 1
+                if not job.prepared:
+                    job.config = await signer.prepare_run(self.num_of_dialogs)
+                    if not job.config.send_only:
+                        signer.add_message_handlers(job.targets)
+                    job.prepared = True
+                if signer.uses_server_schedule(job.config):
+                    # 由Telegram定时消息完成签到，只需在定时消息不足时补充
+                    next_run = await signer.sync_server_schedule(job.config)
+                else:
+                    now = await signer.run_cycle(job.config, fire_at=job.fire_at)
+                    next_run = self.next_run(job, now)
+            self.supervisor.record_success(account)
+            job.runs += 1
+            signer.log(f"下次运行时间: {next_run}")
+            if job.config.precise and not signer.uses_server_schedule(job.config):
+                # 提前连接，由precise_fire在准确时间发送
+                job.fire_at = next_run
+                self.push(job, next_run.timestamp() - job.config.precise_lead_seconds)
+            else:
+                self.push(job, next_run.timestamp())
+        except (OSError, errors.Unauthorized) as e:
+            job.failures += 1
+            job.fire_at = None
+            logger.debug(e, exc_info=True)
+            self.push(job, time.time() + self.supervisor.record_failure(account, e))
+        except Exception as e:
+            job.failures += 1
+            job.fire_at = None
+            signer.log(f"任务执行异常: {e}", level="ERROR")
+            logger.exception(e)
+            self.push(job, time.time() + self.supervisor.record_failure(account, e))
+        finally:
+            self._running.pop(job.key, None)
+
+    async def run_forever(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.spread:
+            for entry in self.plan():
+                logger.info(
+                    f"计划: {entry['job']} 偏移{entry['offset']}秒, 下次运行 {entry['next_run']}"
+                )
+        self._stagger_initial()
+        status_task = asyncio.create_task(self._status_loop())
+        try:
+            while True:
+                if not self._heap:
+                    if not self._running:
+                        logger.warning("没有可调度的任务，调度器退出")
+                        return
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                fire_at, _, job = self._heap[0]
+                delay = fire_at - time.time()
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(self._heap)
+                self._running[job.key] = asyncio.create_task(self._run_job(job))
+        finally:
+            status_task.cancel()
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger("tg-signer")
+
+HEALTHY = "healthy"  # 正常
+DEGRADED = "degraded"  # 有连续失败，但未达到熔断阈值
+OPEN = "open"  # 已熔断，在冷却时间内不再尝试
+HALF_OPEN = "half_open"  # 冷却结束，允许一次试探
+
+
+class Backoff:
+    """带随机抖动的指数退避"""
+
+    def __init__(
+        self,
+        base: float = 30,
+        factor: float = 2,
+        max_delay: float = 3600,
+        jitter: float = 0.5,
+    ):
+        """
+        :param base: 第一次失败后的等待秒数
+        :param factor: 每次连续失败后等待时间的倍数
+        :param max_delay: 最长等待秒数
+        :param jitter: 随机抖动比例，实际等待时间在``[delay * (1 - jitter), delay]``之间，
+            避免大量账号同时重试
+        """
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, failures: int) -> float:
+        if failures <= 0:
+            return 0.0
+        delay = min(self.max_delay, self.base * self.factor ** (failures - 1))
+        return random.uniform(delay * (1 - self.jitter), delay)
+
+
+class CircuitBreaker:
+    """
+    熔断器。连续失败达到``failure_threshold``次后打开，``reset_timeout``秒内不再尝试；
+    冷却结束后进入半开状态，只允许一次试探，试探成功则恢复，失败则再次打开并加倍冷却时间。
+    实际冷却时间带有随机抖动，避免同时熔断的大量账号同时恢复尝试。
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 600,
+        max_reset_timeout: float = 6 * 3600,
+        jitter: float = 0.25,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.jitter = jitter
+        self.cooldown = reset_timeout  # 本次熔断的实际冷却时间
+        self.failures = 0  # 连续失败次数
+        self.total_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_at: Optional[float] = None  # 半开状态下进行中的试探的开始时间
+        self.last_error: Optional[str] = None
+        self.last_success_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is not None:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return OPEN
+            return HALF_OPEN
+        if self.failures:
+            return DEGRADED
+        return HEALTHY
+
+    def allow(self) -> bool:
+        """是否允许尝试。半开状态下只放行一次试探，直到其结果被记录（或超过冷却时间未记录）"""
+        state = self.state
+        if state == OPEN:
+            return False
+        if state == HALF_OPEN:
+            now = time.monotonic()
+            if self.probe_at is not None and now - self.probe_at < self.cooldown:
+                return False
+            self.probe_at = now
+        return True
+
+    def retry_in(self) -> float:
+        """距离允许下次尝试的秒数"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+        self.reset_timeout = self.base_reset_timeout
+        self.last_success_at = time.time()
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        self.failures += 1
+        self.total_failures += 1
+        if error is not None:
+            self.last_error = f"{type(error).__name__}: {error}"
+        state = self.state
+        if state == OPEN:
+            # 熔断前已开始的调用失败，不再延长冷却时间
+            return
+        if state == HALF_OPEN:
+            if self.probe_at is not None:
+                # 试探失败
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            self._open()
+        elif self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self.probe_at = None
+        self.cooldown = self.reset_timeout * random.uniform(1 - self.jitter, 1)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "total_failures": self.total_failures,
+            "retry_in": round(self.retry_in(), 3),
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at,
+        }
+
+
+class Supervisor:
+    """
+    按账号管理失败重试：每个账号一个熔断器，失败后按指数退避（带抖动）等待，
+    并可隔离运行多个账号的协程，单个账号异常不影响其他账号。
+    """
+
+    probe_poll_interval = 1.0  # 半开状态下等待试探结果时的检查间隔
+
+    def __init__(
+        self,
+        backoff: Optional[Backoff] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 600,
+    ):
+        self.backoff = backoff or Backoff()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[Hashable, CircuitBreaker] = {}
+
+    def breaker(self, account: Hashable) -> CircuitBreaker:
+        breaker = self.breakers.get(account)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self.breakers[account] = breaker
+        return breaker
+
+    def record_success(self, account: Hashable):
+        breaker = self.breaker(account)
+        if breaker.failures:
+            logger.info(f"账号「{account}」已恢复")
+        breaker.record_success()
+
+    def record_failure(
+        self, account: Hashable, error: Optional[BaseException] = None
+    ) -> float:
+        """记录一次失败，返回下次尝试前应等待的秒数"""
+        breaker = self.breaker(account)
+        breaker.record_failure(error)
+        if breaker.state == OPEN:
+            delay = breaker.retry_in()
+            logger.warning(
+                f"账号「{account}」连续失败{breaker.failures}次，暂停{delay:.0f}秒: {error}"
+            )
+        else:
+            delay = self.backoff.delay(breaker.failures)
+            logger.warning(
+                f"账号「{account}」第{breaker.failures}次失败，{delay:.0f}秒后重试: {error}"
+            )
+        return delay
+
+    async def wait_until_allowed(self, account: Hashable):
+        breaker = self.breaker(account)
+        while not breaker.allow():
+            # 半开状态下等待其他调用方的试探结果
+            await asyncio.sleep(breaker.retry_in() or self.probe_poll_interval)
+
+    def health(self) -> Dict[str, dict]:
+        return {str(k): b.stats() for k, b in self.breakers.items()}
+
+    async def run_isolated(
+        self,
+        account: Hashable,
+        factory: Callable[[], Awaitable],
+        restart: bool = True,
+    ):
+        """
+        运行``factory()``，异常不会向外抛出：记录失败，``restart``时按退避时间重新运行，
+        直到其正常结束。
+        """
+        while True:
+            await self.wait_until_allowed(account)
+            try:
+                result = await factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(e)
+                delay = self.record_failure(account, e)
+                if not restart:
+                    return None
+                await asyncio.sleep(delay)
+                continue
+            self.record_success(account)
+            return result
+
+    async def gather_isolated(
+        self,
+        jobs: List[Tuple[Hashable, Callable[[], Awaitable]]],
+        restart: bool = True,
+    ):
+        """隔离运行多个(账号, 协程工厂)，单个账号的异常不会中断其他账号"""
+        return await asyncio.gather(
+            *(
+                self.run_isolated(account, factory, restart=restart)
+                for account, factory in jobs
+            )
+        )
+
+
+_SUPERVISOR: Optional[Supervisor] = None
+
+
+def get_supervisor() -> Supervisor:
+    global _SUPERVISOR
+    if _SUPERVISOR is None:
+        _SUPERVISOR = Supervisor()
+    return _SUPERVISOR